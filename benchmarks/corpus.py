@@ -0,0 +1,142 @@
+# ========================================================================
+# Copyright 2017 Emory University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========================================================================
+import random
+
+__author__ = 'Jinho D. Choi'
+
+
+# ======================================== Vocabulary ========================================
+
+WORDS = ('the of and to in a is that for it as was with be by on not he this are or his from at which but have an they '
+         'you were her she there one all we their been has when who will more if out so said what up its about than '
+         'into them can only other new some could time these two may then do first any my now such like our over man '
+         'me even most made after also did many before must through back years where much your way well down should '
+         'because each just those people how too little state good very make world still own see men work long get '
+         'here between both life being under never day same another know while last might us great old year off come '
+         'since against go came right used take three university professor language computer science research student '
+         'data model system analysis result method paper question answer movie ending favorite night music').split()
+
+ABBREVIATIONS = ('Dr.', 'Mr.', 'Mrs.', 'Prof.', 'U.S.', 'Ph.D.', 'e.g.', 'i.e.', 'etc.', 'a.m.', 'p.m.', 'No.')
+CONTRACTIONS = ("don't", "can't", "I'm", "it's", "we're", "they've", "he'll", "wouldn't", "I'd", "she's")
+NUMBERS = ('1', '2018', '3.14', '1,000', '10kg', '5cm', '$20', '#1', '50%', '9:30', '000-0000')
+EMOTICONS = (':)', ':(', ':-)', ':D', ';)', '<3', ':p', 'XD', ':/', '(:')
+EMOJIS = ('\U0001F600', '\U0001F602', '\U0001F44D', '\U0001F525', '\u2764', '\U0001F64F')
+TLDS = ('com', 'org', 'edu', 'net', 'io', 'co.uk')
+ENTITIES = ('&amp;', '&lt;', '&gt;', '&quot;', '&#8592;', '&#x2190;')
+
+
+# ======================================== Generators ========================================
+
+def english_sentence(rng):
+    n = rng.randint(5, 30)
+    words = []
+
+    for i in range(n):
+        r = rng.random()
+        if r < 0.03: w = rng.choice(ABBREVIATIONS)
+        elif r < 0.06: w = rng.choice(CONTRACTIONS)
+        elif r < 0.09: w = rng.choice(NUMBERS)
+        else: w = rng.choice(WORDS)
+
+        r = rng.random()
+        if r < 0.07: w += ','
+        elif r < 0.09: w = '"%s"' % w
+        elif r < 0.10: w = '(%s)' % w
+        elif r < 0.11: w += ';'
+        words.append(w)
+
+    words[0] = words[0][0].upper() + words[0][1:]
+    return ' '.join(words) + rng.choice(('.', '.', '.', '?', '!', '...', '."'))
+
+
+def url(rng):
+    host = '.'.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))) + '.' + rng.choice(TLDS)
+    path = '/'.join(rng.choice(WORDS) for _ in range(rng.randint(0, 4)))
+    query = '&'.join('%s=%d' % (rng.choice(WORDS), rng.randint(0, 999)) for _ in range(rng.randint(0, 3)))
+    return '%s://%s/%s%s' % (rng.choice(('http', 'https', 'ftp')), host, path, '?' + query if query else '')
+
+
+def email(rng):
+    return '%s.%s@%s.%s' % (rng.choice(WORDS), rng.choice(WORDS), rng.choice(WORDS), rng.choice(TLDS))
+
+
+def tweet(rng):
+    words = []
+
+    for i in range(rng.randint(3, 25)):
+        r = rng.random()
+        if r < 0.08: w = '@' + rng.choice(WORDS) + str(rng.randint(0, 99))
+        elif r < 0.14: w = '#' + rng.choice(WORDS) + rng.choice(WORDS)
+        elif r < 0.20: w = rng.choice(EMOTICONS)
+        elif r < 0.24: w = rng.choice(EMOJIS)
+        elif r < 0.27: w = url(rng)
+        elif r < 0.31: w = rng.choice(WORDS) + rng.choice(WORDS)[-1] * rng.randint(2, 6)
+        elif r < 0.35: w = rng.choice(WORDS).upper()
+        elif r < 0.40: w = rng.choice(CONTRACTIONS)
+        else: w = rng.choice(WORDS)
+
+        if rng.random() < 0.08: w += rng.choice(('!!', '?!', '...', '!', ','))
+        words.append(w)
+
+    return ' '.join(words)
+
+
+def url_line(rng):
+    items = []
+
+    for i in range(rng.randint(3, 15)):
+        r = rng.random()
+        if r < 0.35: items.append(url(rng))
+        elif r < 0.50: items.append(email(rng))
+        elif r < 0.60: items.append(rng.choice(ENTITIES))
+        elif r < 0.70: items.append('[%d]' % rng.randint(1, 20))
+        else: items.append(rng.choice(WORDS))
+
+    return ' '.join(items)
+
+
+# ======================================== Corpora ========================================
+
+CORPORA = {
+    'english': lambda rng: english_sentence(rng),
+    'tweet': tweet,
+    'url': url_line,
+}
+
+
+def generate_corpus(name, num_documents=1000, lines_per_document=10, seed=1):
+    """
+    Generates a deterministic synthetic corpus without any external resource.
+    :param name: the name of the corpus (english, tweet, or url).
+    :type name: str
+    :param num_documents: the number of documents.
+    :type num_documents: int
+    :param lines_per_document: the average number of lines in each document.
+    :type lines_per_document: int
+    :param seed: the random seed; the same seed always generates the same corpus.
+    :type seed: int
+    :return: the list of documents, where each document is the list of lines ending with the newline character.
+    :rtype: list of (list of str)
+    """
+    line = CORPORA[name]
+    rng = random.Random('%s-%d' % (name, seed))
+    documents = []
+
+    for i in range(num_documents):
+        n = rng.randint(1, 2 * lines_per_document - 1)
+        documents.append([line(rng) + '\n' for _ in range(n)])
+
+    return documents
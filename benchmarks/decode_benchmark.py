@@ -0,0 +1,275 @@
+# ========================================================================
+# Copyright 2017 Emory University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========================================================================
+import argparse
+import json
+import multiprocessing
+import platform
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.corpus import CORPORA, generate_corpus
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+__author__ = 'Jinho D. Choi'
+
+
+# ======================================== Benchmarks ========================================
+
+def space_tokenizer(resource_dir):
+    from elit.nlp.task.tokenize import SpaceTokenizer
+    tokenizer = SpaceTokenizer()
+    return lambda lines: len(tokenizer.decode(''.join(lines))[0])
+
+
+def english_tokenizer(resource_dir, scanner=False, cache_size=0):
+    from elit.nlp.task.tokenize import EnglishTokenizer
+    tokenizer = EnglishTokenizer(resource_dir + '/tokenize', scanner=scanner, cache_size=cache_size)
+    return lambda lines: len(tokenizer.decode(''.join(lines))[0])
+
+
+def english_tokenizer_scanner(resource_dir):
+    return english_tokenizer(resource_dir, scanner=True)
+
+
+def english_tokenizer_cache(resource_dir):
+    return english_tokenizer(resource_dir, cache_size=100000)
+
+
+def english_segmenter(resource_dir):
+    from elit.nlp.task.tokenize import EnglishTokenizer, EnglishSegmenter
+    tokenizer = EnglishTokenizer(resource_dir + '/tokenize')
+    segmenter = EnglishSegmenter()
+
+    def decode(lines):
+        tokens, offsets = lines
+        segmenter.decode(tokens, offsets)
+        return len(tokens)
+
+    # tokenization is done before timing such that only segmentation is measured
+    return decode, lambda lines: tokenizer.decode(''.join(lines))
+
+
+def decoder(resource_dir, input_format):
+    from elit.decode import EnglishDecoder
+    from elit.nlp.structure import TOKEN
+    from elit.util.configure import Configuration
+    config = Configuration(input_format=input_format)
+    d = EnglishDecoder(resource_dir, config)
+    return lambda lines: sum(len(s[TOKEN]) for s in d.decode_document(config, lines))
+
+
+def decode_raw(resource_dir):
+    from elit.util.configure import INPUT_FORMAT_RAW
+    return decoder(resource_dir, INPUT_FORMAT_RAW)
+
+
+def decode_line(resource_dir):
+    from elit.util.configure import INPUT_FORMAT_LINE
+    return decoder(resource_dir, INPUT_FORMAT_LINE)
+
+
+BENCHMARKS = {
+    'space_tokenizer': space_tokenizer,
+    'english_tokenizer': english_tokenizer,
+    'english_tokenizer_scanner': english_tokenizer_scanner,
+    'english_tokenizer_cache': english_tokenizer_cache,
+    'english_segmenter': english_segmenter,
+    'decode_raw': decode_raw,
+    'decode_line': decode_line,
+}
+
+
+# ======================================== Measurement ========================================
+
+def peak_rss():
+    """
+    :return: the peak resident set size of this process in megabytes; None if not supported by the platform.
+    :rtype: float
+    """
+    if resource is None: return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def run_benchmark(name, corpus, resource_dir, num_documents, seed, warmup):
+    """
+    Runs one benchmark on one corpus; called in a fresh process such that the peak RSS belongs to this benchmark only.
+    :param name: the name of the benchmark in BENCHMARKS.
+    :type name: str
+    :param corpus: the name of the corpus in benchmarks.corpus.CORPORA.
+    :type corpus: str
+    :param resource_dir: the path to the resource directory.
+    :type resource_dir: str
+    :param num_documents: the number of documents to be decoded.
+    :type num_documents: int
+    :param seed: the random seed of the corpus.
+    :type seed: int
+    :param warmup: the number of documents decoded before timing.
+    :type warmup: int
+    :return: the metrics of the benchmark.
+    :rtype: dict
+    """
+    documents = generate_corpus(corpus, num_documents, seed=seed)
+    rss_start = peak_rss()
+    decode = BENCHMARKS[name](resource_dir)
+
+    if isinstance(decode, tuple):
+        decode, prepare = decode
+        documents = [prepare(lines) for lines in documents]
+
+    for lines in documents[:warmup]:
+        decode(lines)
+
+    latencies = []
+    num_tokens = 0
+    begin = time.perf_counter()
+
+    for lines in documents:
+        t = time.perf_counter()
+        num_tokens += decode(lines)
+        latencies.append(time.perf_counter() - t)
+
+    elapsed = time.perf_counter() - begin
+    latencies = np.array(latencies) * 1000
+
+    return {'documents': len(documents),
+            'tokens': num_tokens,
+            'seconds': elapsed,
+            'tokens_per_sec': num_tokens / elapsed,
+            'documents_per_sec': len(documents) / elapsed,
+            'latency_p50_ms': float(np.percentile(latencies, 50)),
+            'latency_p99_ms': float(np.percentile(latencies, 99)),
+            'rss_start_mb': rss_start,
+            'rss_peak_mb': peak_rss()}
+
+
+def environment():
+    """
+    :return: the information about the environment where the benchmarks are run.
+    :rtype: dict
+    """
+    return {'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'numpy': np.__version__,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+# ======================================== Comparison ========================================
+
+# metrics whose larger values are better; the other metrics are better when smaller
+HIGHER_IS_BETTER = {'tokens_per_sec', 'documents_per_sec'}
+COMPARED_METRICS = ('tokens_per_sec', 'documents_per_sec', 'latency_p50_ms', 'latency_p99_ms', 'rss_peak_mb')
+
+
+def compare(baseline, report, tolerance=0.05):
+    """
+    :param baseline: the report of a previous run.
+    :type baseline: dict
+    :param report: the report of the current run.
+    :type report: dict
+    :param tolerance: the relative change within which a metric is not considered as a regression.
+    :type tolerance: float
+    :return:
+        the lines showing the ratio of each metric (current / baseline) for the benchmarks in both reports,
+        where regressions are marked with '*'.
+    :rtype: list of str
+    """
+    lines = ['%-10s %-24s %-18s %12s %12s %8s' % ('corpus', 'benchmark', 'metric', 'baseline', 'current', 'ratio')]
+
+    for corpus, results in report['results'].items():
+        for name, metrics in results.items():
+            old = baseline.get('results', {}).get(corpus, {}).get(name)
+            if old is None: continue
+
+            for metric in COMPARED_METRICS:
+                a, b = old.get(metric), metrics.get(metric)
+                if not a or b is None: continue
+                ratio = b / a
+                better = ratio >= 1 - tolerance if metric in HIGHER_IS_BETTER else ratio <= 1 + tolerance
+                lines.append('%-10s %-24s %-18s %12.2f %12.2f %7.2f%s' %
+                             (corpus, name, metric, a, b, ratio, '' if better else ' *'))
+
+    return lines
+
+
+# ======================================== Main ========================================
+
+def benchmark_args():
+    parser = argparse.ArgumentParser('Benchmark: measure the throughput, latency, and memory of decoding')
+
+    parser.add_argument('-r', '--resource_dir', type=str, metavar='filepath', required=True, help='path to the resource directory')
+    parser.add_argument('-o', '--output', type=str, metavar='filepath', default=None, help='path to the JSON report')
+    parser.add_argument('-c', '--compare', type=str, metavar='filepath', default=None, help='path to a previous JSON report to compare with')
+    parser.add_argument('-t', '--tolerance', type=float, metavar='float', default=0.05, help='relative change not reported as a regression')
+
+    parser.add_argument('-b', '--benchmarks', type=str, metavar='str[,str]*', default=','.join(BENCHMARKS), help='benchmarks to run')
+    parser.add_argument('-cp', '--corpora', type=str, metavar='str[,str]*', default=','.join(CORPORA), help='corpora to run the benchmarks on')
+    parser.add_argument('-n', '--num_documents', type=int, metavar='int', default=1000, help='number of documents in each corpus')
+    parser.add_argument('-s', '--seed', type=int, metavar='int', default=1, help='random seed of the corpora')
+    parser.add_argument('-w', '--warmup', type=int, metavar='int', default=50, help='number of documents decoded before timing')
+
+    return parser.parse_args()
+
+
+def main():
+    args = benchmark_args()
+    names = args.benchmarks.split(',')
+    corpora = args.corpora.split(',')
+
+    for name in names:
+        if name not in BENCHMARKS: raise ValueError('Unknown benchmark: ' + name)
+    for corpus in corpora:
+        if corpus not in CORPORA: raise ValueError('Unknown corpus: ' + corpus)
+
+    report = {'environment': environment(),
+              'settings': {'num_documents': args.num_documents, 'seed': args.seed, 'warmup': args.warmup},
+              'results': {}}
+
+    # each benchmark runs in a fresh process such that neither memory nor caches leak into the next one
+    context = multiprocessing.get_context('spawn')
+
+    for corpus in corpora:
+        results = report['results'].setdefault(corpus, {})
+
+        for name in names:
+            with context.Pool(1) as pool:
+                metrics = pool.apply(run_benchmark, (name, corpus, args.resource_dir, args.num_documents, args.seed, args.warmup))
+
+            results[name] = metrics
+            print('%-10s %-24s %12.0f tokens/sec %10.2f docs/sec  p50 %8.3f ms  p99 %8.3f ms' %
+                  (corpus, name, metrics['tokens_per_sec'], metrics['documents_per_sec'],
+                   metrics['latency_p50_ms'], metrics['latency_p99_ms']))
+
+    if args.output:
+        with open(args.output, 'w') as fout:
+            json.dump(report, fout, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as fin:
+            print('\n'.join(compare(json.load(fin), report, args.tolerance)))
+
+
+if __name__ == '__main__':
+    main()
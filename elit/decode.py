@@ -14,20 +14,102 @@
 # limitations under the License.
 # ========================================================================
 import abc
-import json
+import collections
+import copy
+import itertools
+import multiprocessing
 import os
+import re
 
 from elit.nlp.task.sentiment import TwitterSentimentAnalyzer, MovieSentimentAnalyzer
 from elit.nlp.task.tokenize import SpaceTokenizer, EnglishTokenizer, EnglishSegmenter
 from elit.nlp.structure import TOKEN, OFFSET, SENTIMENT
 from elit.nlp.lexicon import Word2VecTmp
+from elit.util.cache import get_resource
 from elit.util.configure import *
+from elit.util.writer import create_writer
 
 __author__ = 'Jinho D. Choi'
 
 
+# the maximum number of characters tokenized at once; longer documents are processed in windows of this size
 DOC_MAX_SIZE = 10485760
 DOC_DELIM = '@#DOC$%'
+# the last whitespace in a window, using the same definition of whitespace as the tokenizers (\s)
+RE_LAST_SPACE = re.compile(r'\s\S*\Z')
+
+
+def read_documents(istream):
+    """
+    Splits the input stream into documents by DOC_DELIM.
+    :param istream: either StringIO or File
+    :return: the generator yielding the lines of each document.
+    :rtype: generator of (list of str)
+    """
+    for lines in iter_documents(istream):
+        yield list(lines)
+
+
+def iter_documents(istream):
+    """
+    Splits the input stream into documents by DOC_DELIM without keeping the lines of each document in memory.
+    Each document must be consumed before the next one is requested; the remaining lines are skipped otherwise.
+    :param istream: either StringIO or File
+    :return: the generator yielding the iterator over the lines of each document.
+    :rtype: generator of (iterator of str)
+    """
+    def lines(first):
+        if first.strip() == DOC_DELIM: return
+        yield first
+
+        for line in it:
+            if line.strip() == DOC_DELIM: return
+            yield line
+
+    it = iter(istream)
+
+    for line in it:
+        document = lines(line)
+        yield document
+        for _ in document: pass
+
+
+def iter_windows(lines, offset=0, size=DOC_MAX_SIZE):
+    """
+    Joins the lines into windows of at most the size, each of which ends right after the last whitespace in it
+    such that no token is split across windows unless the token itself is longer than the size.
+    :param lines: the lines of a text.
+    :type lines: iterator of str
+    :param offset: the starting offset.
+    :type offset: int
+    :param size: the maximum number of characters in each window.
+    :type size: int
+    :return: the generator yielding the (text, offset) pair of each window, where the offset is the position of the window.
+    :rtype: generator of (str, int)
+    """
+    buffer = []
+    length = 0
+
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length < size: continue
+
+        text = ''.join(buffer)
+        begin = 0
+
+        while len(text) - begin >= size:
+            m = RE_LAST_SPACE.search(text, begin, begin + size)
+            end = m.start() + 1 if m else begin + size
+            yield text[begin:end], offset + begin
+            begin = end
+
+        buffer = [text[begin:]]
+        length = len(text) - begin
+        offset += begin
+
+    text = ''.join(buffer)
+    if text: yield text, offset
 
 
 class Decoder:
@@ -36,61 +118,67 @@ class Decoder:
         :param config: elit.configuration.Configuration
         :param istream: either StringIO or File
         :param ostream: either StringIO or File
-        :return:
+        :return: the list of decoded documents if ostream is None; otherwise, an empty list.
+        """
+        if not is_valid_output_format(config.output_format):
+            raise ValueError('invalid output format: %s' % config.output_format)
+
+        documents = self.iter_decode(config, istream)
+        if ostream is None: return list(documents)
+
+        with create_writer(config.output_format, ostream) as writer:
+            for d in documents: writer.write(d)
+
+        return []
+
+    def iter_decode(self, config, istream):
+        """
+        Decodes the input stream lazily such that only one document is kept in memory at a time, where the lines of
+        the document are read as its windows are tokenized (see iter_documents()) so that the input is not buffered;
+        the decoded sentences of the document are still kept in memory until the document is yielded.
+        :param config: elit.configuration.Configuration
+        :param istream: either StringIO or File
+        :return: the generator yielding each decoded document (the list of sentences).
+        """
+        return (self.decode_document(config, lines) for lines in iter_documents(istream))
+
+    def decode_document(self, config, lines):
+        """
+        :param config: elit.configuration.Configuration
+        :param lines: the lines in the document.
+        :type lines: iterator of str
+        :return: the decoded document (the list of sentences).
         """
-        if ostream is not None: ostream.write('[')
         decode = self.decode_raw if config.input_format == INPUT_FORMAT_RAW else self.decode_line
-        d = decode(config, istream, ostream)
-        if ostream is not None: ostream.write(']')
-        return d
-
-    def decode_raw(self, config, istream, ostream=None):
-        def decode():
-            d = self.text_to_sentences(config, ''.join(lines))
-            if ostream is None:
-                documents.append(d)
-            else:
-                ostream.write(str(json.dumps(d)) + ',')
-
-        documents = []
-        offset = 0
-        lines = []
-
-        for line in istream:
-            if line.strip() == DOC_DELIM:
-                decode()
-                offset = 0
-                lines.clear()
-            elif offset + len(line) <= DOC_MAX_SIZE:
-                offset += len(line)
-                lines.append(line)
-
-        if lines: decode()
-        return documents
+        return decode(config, lines)
 
-    def decode_line(self, config, istream, ostream=None):
-        def decode():
-            if ostream is None:
-                documents.append(sentences)
-            else:
-                ostream.write(str(json.dumps(sentences)) + ',')
+    def decode_documents(self, config, documents):
+        """
+        :param config: elit.configuration.Configuration
+        :param documents: the lines of each document.
+        :type documents: list of (list of str)
+        :return: the list of decoded documents.
+        """
+        return [self.decode_document(config, lines) for lines in documents]
 
-        documents = []
+    def decode_raw(self, config, lines):
+        """
+        :return: the decoded document where the text in the document is processed as a whole.
+        """
+        return self.windows_to_sentences(config, iter_windows(lines))
+
+    def decode_line(self, config, lines):
+        """
+        :return: the decoded document where every line in the document is processed separately.
+        """
         sentences = []
         offset = 0
 
-        for line in istream:
-            if line.strip() == DOC_DELIM:
-                decode()
-                offset = 0
-                sentences = []
-            elif offset + len(line) <= DOC_MAX_SIZE:
-                d = self.text_to_sentences(config, line, offset)
-                offset += len(line)
-                sentences.extend(d)
-
-        if sentences: decode()
-        return documents
+        for line in lines:
+            sentences.extend(self.windows_to_sentences(config, iter_windows([line], offset)))
+            offset += len(line)
+
+        return sentences
 
     ############################## CONVERSION ##############################
 
@@ -98,23 +186,44 @@ class Decoder:
     def text_to_sentences(self, config, text, offset=0):
         return
 
+    def windows_to_sentences(self, config, windows):
+        """
+        :param config: elit.configuration.Configuration
+        :param windows: the iterator of (text, offset) pairs of the windows in a text (see iter_windows()).
+        :type windows: iterator of (str, int)
+        :return: the sentences of the text, where each window is processed separately unless overridden.
+        :rtype: list of dict
+        """
+        sentences = []
+
+        for text, offset in windows:
+            sentences.extend(self.text_to_sentences(config, text, offset))
+
+        return sentences
+
     def params_to_config(self, params):
+        """
+        :param params: the request parameters (text, input_format, tokenize, segment, sentiment, output_format).
+        :type params: dict of str
+        :return: the tuple of (configuration, error messages).
+        :rtype: (elit.util.configure.Configuration, list of str)
+        """
         errors = []
 
         # input text
-        input_text = params.score()
+        input_text = params.get('text', '')
 
         if not input_text:
             errors.append('input text is missing')
 
         # input format
-        input_format = params.score()
+        input_format = params.get('input_format', INPUT_FORMAT_RAW)
 
         if not is_valid_input_format(input_format):
             errors.append('invalid input format: '+input_format)
 
         # tokenize
-        tokenize = params.score()
+        tokenize = params.get('tokenize', '1')
 
         if tokenize not in {'0', '1'}:
             errors.append('invalid tokenize: '+tokenize)
@@ -122,7 +231,7 @@ class Decoder:
         tokenize = False if tokenize == '0' else True
 
         # segment
-        segment = params.score()
+        segment = params.get('segment', '1')
 
         if segment not in {'0', '1'}:
             errors.append('invalid segment: '+segment)
@@ -130,51 +239,169 @@ class Decoder:
         segment = False if segment == '0' else True
 
         # sentiment
-        sentiment = list(filter(None, params.score().split(',')))
+        sentiment = list(filter(None, params.get('sentiment', '').split(',')))
 
         if not all(is_valid_sentiment(s) for s in sentiment):
             errors.append('invalid sentiment: '+','.join(sentiment))
 
+        # output format
+        output_format = params.get('output_format', OUTPUT_FORMAT_JSON)
+
+        if not is_valid_output_format(output_format):
+            errors.append('invalid output format: '+output_format)
+
         config = Configuration(language=LANGUAGE_ENGLISH,
                                input_format=input_format,
                                tokenize=tokenize,
                                segment=segment,
-                               sentiment=sentiment)
+                               sentiment=sentiment,
+                               output_format=output_format)
 
         return config, errors
 
 
 class EnglishDecoder(Decoder):
-    def __init__(self, resource_dir, config):
-        # init tokenizer
+    def __init__(self, resource_dir, config=None, max_batch_sentences=2000, max_batch_tokens=50000, mmap=None,
+                 tokenizer_cache_size=0):
+        """
+        Components are loaded on demand the first time they are used, and shared across decoders in the same process
+        whose resource paths and settings (mmap, tokenizer_cache_size) are the same.
+        :param resource_dir: the path to the directory containing resources.
+        :type resource_dir: str
+        :param config: if not None, the components required by this configuration are loaded in advance.
+        :type config: elit.util.configure.Configuration
+        :param max_batch_sentences: sentiment analysis is performed once for documents whose total number of sentences reaches this budget.
+        :type max_batch_sentences: int
+        :param max_batch_tokens: sentiment analysis is performed once for documents whose total number of tokens reaches this budget.
+        :type max_batch_tokens: int
+        :param mmap: if 'r', embeddings are memory-mapped such that worker processes share them (see elit.nlp.lexicon.Word2VecTmp).
+        :type mmap: str
+        :param tokenizer_cache_size: if > 0, the maximum number of chunks memorized by the tokenizer (see elit.nlp.task.tokenize.EnglishTokenizer).
+        :type tokenizer_cache_size: int
+        """
+        self.resource_dir = resource_dir
+        self.mmap = mmap
+        self.tokenizer_cache_size = tokenizer_cache_size
+        self.max_batch_sentences = max_batch_sentences
+        self.max_batch_tokens = max_batch_tokens
         self.tokenizer_space = SpaceTokenizer()
-        if config.tokenize: self.tokenizer = EnglishTokenizer(os.path.join(resource_dir, 'tokenize'))
+        self.segmenter = EnglishSegmenter()
+        if config is not None: self.load(config)
+
+    def load(self, config):
+        """
+        Loads the components required by the configuration if not already loaded.
+        :param config: elit.configuration.Configuration
+        """
+        if config.tokenize: self.tokenizer
+        if any(s.startswith(SENTIMENT_TWITTER) for s in config.sentiment): self.sentiment_twit
+        if any(s.startswith(SENTIMENT_MOVIE) for s in config.sentiment): self.sentiment_mov
+
+    @property
+    def tokenizer(self):
+        """
+        :rtype: elit.nlp.task.tokenize.EnglishTokenizer
+        """
+        return get_resource((self.resource_path('tokenize'), self.tokenizer_cache_size),
+                            lambda: EnglishTokenizer(self.resource_path('tokenize'), cache_size=self.tokenizer_cache_size))
+
+    @property
+    def sentiment_twit(self):
+        """
+        :rtype: elit.nlp.task.sentiment.TwitterSentimentAnalyzer
+        """
+        return self.sentiment_analyzer(TwitterSentimentAnalyzer, 'embedding/w2v-400-twitter.gnsm', 'sentiment/sentiment-semeval17-400-v2')
+
+    @property
+    def sentiment_mov(self):
+        """
+        :rtype: elit.nlp.task.sentiment.MovieSentimentAnalyzer
+        """
+        return self.sentiment_analyzer(MovieSentimentAnalyzer, 'embedding/w2v-400-amazon-review.gnsm', 'sentiment/sentiment-sst-400-v2')
+
+    def sentiment_analyzer(self, analyzer, emb_file, model_file):
+        """
+        :param analyzer: the class of the sentiment analyzer.
+        :type analyzer: type
+        :param emb_file:
+            the path to the embedding file relative to the resource directory;
+            if the .npy file exported by Word2VecTmp.export() exists next to it, that file is used instead.
+        :type emb_file: str
+        :param model_file: the path to the model file relative to the resource directory.
+        :type model_file: str
+        :rtype: elit.nlp.task.sentiment.SentimentAnalyzer
+        """
+        def create():
+            emb_model = get_resource((emb_file, self.mmap), lambda: Word2VecTmp(emb_file, self.mmap))
+            return analyzer(emb_model, model_file)
+
+        emb_file = self.resource_path(emb_file)
+        npy_file = os.path.splitext(emb_file)[0] + '.npy'
+        if os.path.exists(npy_file): emb_file = npy_file
+        model_file = self.resource_path(model_file)
+        return get_resource((model_file, self.mmap), create)
+
+    def resource_path(self, filename):
+        return os.path.abspath(os.path.join(self.resource_dir, filename))
+
+    def iter_decode(self, config, istream):
+        """
+        Documents are tokenized and segmented one at a time, whereas sentiment analysis is performed across documents
+        in batches bounded by max_batch_sentences and max_batch_tokens.
+        """
+        if not config.sentiment:
+            yield from super(EnglishDecoder, self).iter_decode(config, istream)
+            return
 
-        # init segmenter
-        if config.segment: self.segmenter = EnglishSegmenter()
+        pre_config = self.preprocess_config(config)
+        documents, num_sentences, num_tokens = [], 0, 0
 
-        # init sentiment analyzer: twitter
-        if SENTIMENT_TWITTER in config.sentiment:
-            emb_model = Word2VecTmp(os.path.join(resource_dir, 'embedding/w2v-400-twitter.gnsm'))
-            model_file = os.path.join(resource_dir, 'sentiment/sentiment-semeval17-400-v2')
-            self.sentiment_twit = TwitterSentimentAnalyzer(emb_model, model_file)
+        for lines in iter_documents(istream):
+            d = self.decode_document(pre_config, lines)
+            documents.append(d)
+            num_sentences += len(d)
+            num_tokens += sum(len(sentence[TOKEN]) for sentence in d)
 
-        # init sentiment analyzer: movie review
-        if SENTIMENT_MOVIE in config.sentiment:
-            emb_model = Word2VecTmp(os.path.join(resource_dir, 'embedding/w2v-400-amazon-review.gnsm'))
-            model_file = os.path.join(resource_dir, 'sentiment/sentiment-sst-400-v2')
-            self.sentiment_mov = MovieSentimentAnalyzer(emb_model, model_file)
+            if num_sentences >= self.max_batch_sentences or num_tokens >= self.max_batch_tokens:
+                self.sentiment_analyze(config, [sentence for d in documents for sentence in d])
+                yield from documents
+                documents, num_sentences, num_tokens = [], 0, 0
+
+        if documents:
+            self.sentiment_analyze(config, [sentence for d in documents for sentence in d])
+            yield from documents
+
+    def decode_documents(self, config, documents):
+        """
+        Sentiment analysis is performed once across all documents.
+        """
+        if not config.sentiment: return super(EnglishDecoder, self).decode_documents(config, documents)
+        documents = super(EnglishDecoder, self).decode_documents(self.preprocess_config(config), documents)
+        self.sentiment_analyze(config, [sentence for d in documents for sentence in d])
+        return documents
+
+    @staticmethod
+    def preprocess_config(config):
+        """
+        :return: the copy of the configuration without sentiment analysis.
+        :rtype: elit.util.configure.Configuration
+        """
+        config = copy.copy(config)
+        config.sentiment = ()
+        return config
 
     ############################## CONVERSION ##############################
 
     def text_to_sentences(self, config, text, offset=0):
-        # tokenization
-        tokenizer = self.tokenizer if config.tokenize else self.tokenizer_space
-        tokens, offsets = tokenizer.decode(text, offset)
+        return self.windows_to_sentences(config, [(text, offset)])
 
-        # segmentation
-        sentences = self.segmenter.decode(tokens, offsets) if config.segment \
-                    else [{TOKEN: tokens, OFFSET: offsets}]
+    def windows_to_sentences(self, config, windows):
+        """
+        The tokenizer and the segmenter carry their states across windows such that the sentences are the same as
+        those from processing the whole text at once.
+        """
+        # tokenization and segmentation
+        sentences = list(self.iter_sentences(config, windows))
 
         # sentiment analysis
         if config.sentiment:
@@ -182,6 +409,29 @@ class EnglishDecoder(Decoder):
 
         return sentences
 
+    def iter_sentences(self, config, windows):
+        """
+        Tokenizes and segments the text lazily such that each sentence is yielded as soon as its boundary is confirmed.
+        :param config: elit.configuration.Configuration
+        :param windows: the iterator of (text, offset) pairs of the windows in a text (see iter_windows()).
+        :type windows: iterator of (str, int)
+        :return: the generator yielding each sentence without sentiment analysis.
+        :rtype: generator of dict
+        """
+        tokenizer = self.tokenizer if config.tokenize else self.tokenizer_space
+        pairs = tokenizer.decode_windows(windows)
+
+        if config.segment:
+            yield from self.segmenter.decode_stream(pairs)
+        else:
+            tokens, offsets = [], []
+
+            for token, offset in pairs:
+                tokens.append(token)
+                offsets.append(offset)
+
+            yield {TOKEN: tokens, OFFSET: offsets}
+
     ############################## COMPONENTS ##############################
 
     def sentiment_analyze(self, config, sentences):
@@ -195,6 +445,8 @@ class EnglishDecoder(Decoder):
 
             return an, s.endswith('att'), key
 
+        if not sentences: return
+
         for s in config.sentiment:
             analyzer, att, key = get_analyzer(s)
             sens = [d[TOKEN] for d in sentences]
@@ -203,3 +455,78 @@ class EnglishDecoder(Decoder):
             for i, sentence in enumerate(sentences):
                 sentence[SENTIMENT + '-' + key] = y[i].tolist()
                 if att: sentence[SENTIMENT + '-' + key + '-att'] = att[i].tolist()
+
+
+############################## PARALLEL ##############################
+
+_worker_decoder = None
+
+
+def _init_worker(resource_dir, config, kwargs):
+    global _worker_decoder
+    _worker_decoder = EnglishDecoder(resource_dir, config, **kwargs)
+
+
+def _decode_documents(config, documents):
+    return _worker_decoder.decode_documents(config, documents)
+
+
+def _text_to_sentences(config, text, offset):
+    return _worker_decoder.text_to_sentences(config, text, offset)
+
+
+class ParallelDecoder(Decoder):
+    def __init__(self, resource_dir, config, processes=None, chunksize=1, **kwargs):
+        """
+        ParallelDecoder distributes documents across worker processes, where each worker keeps its own EnglishDecoder
+        such that tokenizer resources and sentiment models are loaded only once per process.
+        :param resource_dir: the path to the directory containing resources.
+        :type resource_dir: str
+        :param config: the configuration used to initialize the decoder in each worker.
+        :type config: elit.util.configure.Configuration
+        :param processes: the number of worker processes; if None, the number of CPUs.
+        :type processes: int
+        :param chunksize: the number of documents sent to a worker at a time.
+        :type chunksize: int
+        :param kwargs: other parameters to initialize EnglishDecoder (e.g., mmap='r' to share embeddings across workers).
+        :type kwargs: dict
+        """
+        self.processes = processes or multiprocessing.cpu_count()
+        self.chunksize = chunksize
+        self.pool = multiprocessing.Pool(self.processes, initializer=_init_worker, initargs=(resource_dir, config, kwargs))
+
+    def iter_decode(self, config, istream):
+        """
+        Decoded documents are yielded in the input order; at most 2 chunks per worker are in flight at a time
+        so that the input stream is not read ahead of the workers.
+        """
+        pending = collections.deque()
+        documents = read_documents(istream)
+
+        while True:
+            while len(pending) < 2 * self.processes:
+                chunk = list(itertools.islice(documents, self.chunksize))
+                if not chunk: break
+                pending.append(self.pool.apply_async(_decode_documents, (config, chunk)))
+
+            if not pending: break
+            yield from pending.popleft().get()
+
+    def decode_document(self, config, lines):
+        return self.pool.apply(_decode_documents, (config, [list(lines)]))[0]
+
+    def text_to_sentences(self, config, text, offset=0):
+        return self.pool.apply(_text_to_sentences, (config, text, offset))
+
+    def close(self):
+        """
+        Terminates the worker processes after all submitted documents are decoded.
+        """
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -14,12 +14,14 @@
 # limitations under the License.
 # ========================================================================
 import abc
+import functools
 import random
 
 import numpy as np
 from mxnet import nd, gluon, autograd
 
 from elit.nlp.structure import OUT
+from elit.nlp.util import X_FST, X_LST
 
 __author__ = 'Jinho D. Choi'
 
@@ -171,16 +173,248 @@ class ForwardState(NLPState, metaclass=abc.ABCMeta):
         label = self.document[self.sen_id][self.key][self.tok_id]
         return self.label_map.add(label)
 
+    def features(self):
+        """
+        Stacks the features of all tokens in the document such that the feature matrix of each token (see self.x)
+        is the rows of its windows, where the subclass defines self.windows and self.embs whose last item is self.output.
+        :return:
+            the tuple of (table, rows), where the table is the (n x d) matrix of all tokens whose sentences are padded
+            by zero rows on both sides, and rows is the array of the row in the table for each token in order.
+        :rtype: (numpy.array, numpy.array)
+        """
+        p = max(abs(w) for w in self.windows)
+        pad = np.tile(np.concatenate([zero for _, zero in self.embs]), (p, 1))
+        blocks = []
+        rows = []
+        begin = 0
+
+        for i, sentence in enumerate(self.document):
+            size = len(sentence)
+            blocks.append(pad)
+            blocks.append(np.column_stack([np.stack(emb[i]) for emb, _ in self.embs]))
+            rows.append(np.arange(begin + p, begin + p + size))
+            begin += size + p
+
+        blocks.append(pad)
+        return np.concatenate(blocks).astype('float32'), np.concatenate(rows)
+
+    @property
+    def step(self):
+        """
+        :return: the number of tokens processed so far.
+        :rtype: int
+        """
+        return sum(len(s) for s in self.document[:self.sen_id]) + self.tok_id
+
+
+class ForwardBatch:
+    def __init__(self, states, batch_size):
+        """
+        ForwardBatch schedules forward states for continuous batching: up to batch_size states are kept in slots
+        whose features are stored in one flat (rows x d) table, where each slot owns the region of its own state,
+        such that the input of the current step for all slots is gathered at once, and the slot of every finished state
+        is refilled by the pending state with the most remaining tokens so that each step stays close to batch_size
+        until the pending states run out. The table is reallocated only when a new state does not fit in its region,
+        so it holds about as many rows as the longest batch_size states rather than batch_size times the longest one.
+        :param states: the input states, all of which have the same windows and embedding dimensions.
+        :type states: list of ForwardState
+        :param batch_size: the maximum number of states processed at each step.
+        :type batch_size: int
+        """
+        def num_tokens(state):
+            return sum(len(s) for s in state.document)
+
+        # pending states sorted by the number of remaining tokens; the longest one is popped first
+        self.pending = sorted((state for state in states if state.has_next()), key=lambda state: num_tokens(state) - state.step)
+        size = min(batch_size, len(self.pending))
+
+        if self.pending:
+            state = self.pending[0]
+            dim = sum(len(zero) for _, zero in state.embs)
+            self.windows = np.array(state.windows)
+            self.num_class = len(state.zero_output)
+        else:
+            dim = 0
+
+        self.slots = [None] * size
+        self.table = np.zeros((0, dim), dtype='float32')
+        self.rows = [None] * size
+        self.bases = np.zeros(size, dtype=int)
+        self.sizes = np.zeros(size, dtype=int)
+        self.lengths = np.zeros(size, dtype=int)
+        self.steps = np.zeros(size, dtype=int)
+        # the row in the table of the current token of each slot
+        self.positions = np.zeros(size, dtype=int)
+
+    def fill(self):
+        """
+        Moves pending states into the slots that are empty or whose states are finished.
+        """
+        refills = []
+
+        for i in np.flatnonzero(self.steps >= self.lengths):
+            if not self.pending: break
+            state = self.pending.pop()
+            refills.append((i, state) + state.features())
+
+        if not refills: return
+        capacities = np.diff(np.append(self.bases, len(self.table)))
+        if any(len(table) > capacities[i] for i, _, table, _ in refills): self.reallocate(refills)
+
+        for i, state, table, rows in refills:
+            base = self.bases[i]
+            self.table[base:base + len(table)] = table
+            self.slots[i] = state
+            self.rows[i] = rows
+            self.sizes[i] = len(table)
+            self.lengths[i] = len(rows)
+            self.steps[i] = state.step
+            if state.has_next(): self.positions[i] = base + rows[state.step]
+
+    def reallocate(self, refills):
+        """
+        Allocates a new table whose regions fit the states being moved into the slots and the states still in progress,
+        where the rows of the states in progress are copied to the new table; finished states release their regions.
+        :param refills: the list of (slot index, state, table, rows) of the states being moved into the slots.
+        :type refills: list of (int, ForwardState, numpy.array, numpy.array)
+        """
+        sizes = np.where(self.steps < self.lengths, self.sizes, 0)
+        for i, _, table, _ in refills: sizes[i] = len(table)
+
+        bases = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(int)
+        table = np.zeros((sizes.sum(), self.table.shape[1]), dtype='float32')
+
+        for i in np.flatnonzero(self.steps < self.lengths):
+            table[bases[i]:bases[i] + self.sizes[i]] = self.table[self.bases[i]:self.bases[i] + self.sizes[i]]
+            self.positions[i] += bases[i] - self.bases[i]
+
+        self.table = table
+        self.bases = bases
+
+    def active(self):
+        """
+        :return: the indices of the slots whose states have the next step, after refilling the slots.
+        :rtype: numpy.array
+        """
+        self.fill()
+        return np.flatnonzero(self.steps < self.lengths)
+
+    def x(self, indices):
+        """
+        :param indices: the indices of the slots (see self.active()).
+        :type indices: numpy.array
+        :return: the (len(indices) x num_windows x d) input of the current step of the states.
+        :rtype: numpy.array
+        """
+        return self.table[self.positions[indices, None] + self.windows]
+
+    def process(self, indices, output):
+        """
+        Applies the output to the states and the output columns of their current tokens, and moves onto the next step.
+        :param indices: the indices of the slots (see self.active()).
+        :type indices: numpy.array
+        :param output: the (len(indices) x num_class) prediction output.
+        :type output: numpy.array
+        """
+        self.table[self.positions[indices], -self.num_class:] = output[:, :self.num_class]
+        self.steps[indices] += 1
+
+        for i, o in zip(indices, output):
+            self.slots[i].process(o)
+            if self.steps[i] < self.lengths[i]: self.positions[i] = self.bases[i] + self.rows[i][self.steps[i]]
+
+
+class SentenceTagger:
+    def __init__(self, component, vsms, max_len=128, cache_size=100000):
+        """
+        SentenceTagger tags one sentence at a time by the one-pass, left-to-right strategy of ForwardState
+        without creating documents or states, where the features of each token are the position embedding,
+        the embeddings from the vector space models, and the outputs of the previous tokens (e.g., POSState, NERState).
+        :param component: the component whose params have label_map, windows, and zero_output.
+        :type component: NLPComponent
+        :param vsms: the vector space models in the order of the features; None is skipped.
+        :type vsms: list of elit.nlp.lexicon.VectorSpaceModel
+        :param max_len: the number of tokens whose features are allocated in advance; longer sentences reallocate them.
+        :type max_len: int
+        :param cache_size: the maximum number of words whose embeddings are memorized by each vector space model.
+        :type cache_size: int
+        """
+        params = component.params
+        self.model = component.model
+        self.label_map = params.label_map
+        self.windows = np.array(params.windows)
+        self.num_class = len(params.zero_output)
+        self.pad = max(abs(w) for w in params.windows)
+
+        vsms = [vsm for vsm in vsms if vsm is not None]
+        self.dims = [vsm.dim for vsm in vsms]
+        self.embeddings = [functools.lru_cache(maxsize=cache_size)(vsm.get) for vsm in vsms]
+        self.dim = len(X_FST) + sum(self.dims) + self.num_class
+
+        self.table = np.zeros((max_len + 2 * self.pad, self.dim), dtype='float32')
+        self.x = nd.zeros((1, len(self.windows), self.dim), ctx=component.ctx)
+
+    def tag(self, tokens, scores=False):
+        """
+        :param tokens: the tokens in the sentence.
+        :type tokens: list of str
+        :param scores: if True, the prediction scores of the tokens are returned as well.
+        :type scores: bool
+        :return: the predicted labels of the tokens; if scores is True, the tuple of (labels, prediction scores).
+        :rtype: list of str or (list of str, list of numpy.array)
+        """
+        size = len(tokens)
+        p = self.pad
+
+        if len(self.table) < size + 2 * p:
+            self.table = np.zeros((size + 2 * p, self.dim), dtype='float32')
+        else:
+            self.table[:size + 2 * p] = 0
+
+        # position embeddings
+        if size:
+            self.table[p + size - 1, :len(X_LST)] = X_LST
+            self.table[p, :len(X_FST)] = X_FST
+
+        # word embeddings
+        col = len(X_FST)
+        for dim, embedding in zip(self.dims, self.embeddings):
+            for i, token in enumerate(tokens):
+                self.table[p + i, col:col + dim] = embedding(token)
+            col += dim
+
+        labels = []
+        outputs = []
+        num_labels = len(self.label_map)
+
+        for i in range(p, p + size):
+            self.x[0] = self.table[i + self.windows]
+            output = self.model(self.x)[0].asnumpy()
+            self.table[i, -self.num_class:] = output[:self.num_class]
+            labels.append(self.label_map.get(np.argmax(output[:num_labels])))
+            if scores: outputs.append(output)
+
+        return (labels, outputs) if scores else labels
+
+    def cache_info(self):
+        """
+        :return: the statistics of the embedding cache of each vector space model.
+        :rtype: list of functools._CacheInfo
+        """
+        return [embedding.cache_info() for embedding in self.embeddings]
+
 
 # ======================================== Model ========================================
 
-class CNN2DModel(gluon.Block):
+class CNN2DModel(gluon.HybridBlock):
     def __init__(self, input_col, num_class, ngram_conv, dropout, **kwargs):
         """
-        :param kwargs: parameters to initialize gluon.Block.
+        CNN2DModel can be hybridized into a static graph, and exported for inference only (see export_static()).
+        :param kwargs: parameters to initialize gluon.HybridBlock.
         :type kwargs: dict
         """
         super().__init__(**kwargs)
+        self.input_col = input_col
         self.ngram_conv = []
 
         with self.name_scope():
@@ -193,24 +427,55 @@ class CNN2DModel(gluon.Block):
             self.dropout = gluon.nn.Dropout(dropout)
             self.out = gluon.nn.Dense(num_class)
 
-    def forward(self, x):
+    def hybrid_forward(self, F, x):
         # prepare for 2D convolution
-        x = x.reshape((0, 1, x.shape[1], x.shape[2]))
+        x = F.reshape(x, shape=(0, 1, -1, self.input_col))
 
         # n-gram convolutions
-        t = [conv(x).reshape((0, -1)) for conv in self.ngram_conv]
-        x = nd.concat(*t, dim=1)
+        t = [F.reshape(conv(x), shape=(0, -1)) for conv in self.ngram_conv]
+        x = F.concat(*t, dim=1)
         x = self.dropout(x)
 
         # output layer
         x = self.out(x)
         return x
 
+    def export_static(self, filepath, num_rows, ctx):
+        """
+        Hybridizes this model and exports its static graph to sym(filepath) and its parameters to prm(filepath),
+        which are loaded for inference only by import_static().
+        :param filepath: the path to the files to be saved.
+        :type filepath: str
+        :param num_rows: the number of rows in each input (e.g., the number of windows).
+        :type num_rows: int
+        :param ctx: the context (e.g., CPU or GPU) where the parameters of this model are.
+        :type ctx: mxnet.context.Context
+        """
+        self.hybridize()
+        self(nd.zeros((1, num_rows, self.input_col), ctx=ctx))
+        self.export(filepath)
+
+
+def import_static(filepath, ctx):
+    """
+    :param filepath: the path to the files saved by CNN2DModel.export_static().
+    :type filepath: str
+    :param ctx: the context (e.g., CPU or GPU) to process the model.
+    :type ctx: mxnet.context.Context
+    :return:
+        the model executed as a static graph for inference only,
+        which uses MKL-DNN operators on CPU when mxnet is built with MKL-DNN (e.g., mxnet-mkl).
+    :rtype: mxnet.gluon.SymbolBlock
+    """
+    return gluon.SymbolBlock.imports(sym(filepath), ['data'], prm(filepath), ctx=ctx)
+
 
 # ======================================== Component ========================================
 
 def pkl(filepath): return filepath+'.pkl'
 def gln(filepath): return filepath+'.gln'
+def sym(filepath): return filepath+'-symbol.json'
+def prm(filepath): return filepath+'-0000.params'
 
 
 class NLPComponent(metaclass=abc.ABCMeta):
@@ -298,25 +563,25 @@ class NLPComponent(metaclass=abc.ABCMeta):
         :type reset: bool
         """
         tmp = list(states)
+        xs = self._buffer(tmp)
+        ys = np.empty(len(tmp), dtype='float32')
 
         while tmp:
-            begin = 0
             random.shuffle(tmp)
-            xs = nd.array([state.x for state in tmp])
-            ys = nd.array([state.y for state in tmp])
-            batches = gluon.data.DataLoader(gluon.data.ArrayDataset(xs, ys), batch_size=batch_size)
+            self._fill(xs, ys, tmp)
 
-            for x, y in batches:
-                x = x.as_in_context(self.ctx)
-                y = y.as_in_context(self.ctx)
+            for begin in range(0, len(tmp), batch_size):
+                end = min(begin + batch_size, len(tmp))
+                x = nd.array(xs[begin:end], ctx=self.ctx)
+                y = nd.array(ys[begin:end], ctx=self.ctx)
 
                 with autograd.record():
                     output = self.model(x)
                     loss = loss_func(output, y)
                     loss.backward()
 
-                trainer.step(x.shape[0])
-                begin += self._process(tmp, output, begin)
+                trainer.step(end - begin)
+                self._process(tmp, output, begin)
 
             tmp = [state for state in tmp if state.has_next()]
 
@@ -326,26 +591,64 @@ class NLPComponent(metaclass=abc.ABCMeta):
 
         return metric.get() if metric else 0
 
+    @staticmethod
+    def _buffer(states):
+        """
+        :param states: the input states whose features have the same shape.
+        :type states: list of NLPState
+        :return: the buffer allocated once for the features of all states, reused at every step.
+        :rtype: numpy.array
+        """
+        shape = np.shape(states[0].x) if states else ()
+        return np.empty((len(states),) + shape, dtype='float32')
+
+    @staticmethod
+    def _fill(xs, ys, states):
+        """
+        Writes the features (and the gold-standard labels if ys is not None) of the states into the first rows of the buffers.
+        """
+        for i, state in enumerate(states):
+            xs[i] = state.x
+            if ys is not None: ys[i] = state.y
+
     @staticmethod
     def _process(states, output, begin):
-        size = len(output)
+        """
+        Copies the output of the batch to the host once and applies each row to its state.
+        :return: the size of the batch.
+        :rtype: int
+        """
+        output = output.asnumpy()
 
-        for i in range(size):
-            states[begin+i].process(output[i].asnumpy())
+        for i, o in enumerate(output):
+            states[begin+i].process(o)
 
-        return size
+        return len(output)
 
     def _decode(self, states, batch_size):
+        if states and all(isinstance(state, ForwardState) for state in states):
+            return self._decode_forward(states, batch_size)
+
         tmp = list(states)
+        xs = self._buffer(tmp)
 
         while tmp:
-            begin = 0
-            xs = nd.array([state.x for state in tmp])
-            batches = gluon.data.DataLoader(xs, batch_size=batch_size)
+            self._fill(xs, None, tmp)
 
-            for x in batches:
-                x = x.as_in_context(self.ctx)
-                output = self.model(x)
-                begin += self._process(tmp, output, begin)
+            for begin in range(0, len(tmp), batch_size):
+                x = nd.array(xs[begin:min(begin + batch_size, len(tmp))], ctx=self.ctx)
+                self._process(tmp, self.model(x), begin)
 
             tmp = [state for state in tmp if state.has_next()]
+
+    def _decode_forward(self, states, batch_size):
+        """
+        Decodes the states by continuous batching, where the input of each step is gathered by ForwardBatch.
+        """
+        batch = ForwardBatch(states, batch_size)
+        indices = batch.active()
+
+        while len(indices):
+            x = nd.array(batch.x(indices), ctx=self.ctx)
+            batch.process(indices, self.model(x).asnumpy())
+            indices = batch.active()
@@ -171,23 +171,64 @@ class NamedEntityTree:
     #             if w not in
 
 
+PAD_ID = -1
+
+
 class Word2VecTmp:
-    def __init__(self, filepath):
+    def __init__(self, filepath, mmap=None):
         """
-        :param filepath: the path to the file containing word embeddings.
+        The vocabulary is kept in a trie instead of a dictionary; it is memory-mapped together with the embedding matrix
+        only for the .npy file created by #export(), whereas it is built in each process for the other types.
+        :param filepath: the path to the file containing word embeddings (.gnsm, .bin, or .npy created by #export()).
+        :type filepath: str
+        :param mmap:
+            if 'r', the embedding matrix is memory-mapped in the read-only mode (.gnsm, .npy)
+            such that processes loading the same file share its pages through the OS page cache.
+        :type mmap: str
         """
-        self.model = None
-
-        if filepath.endswith('.gnsm'):
-            self.model = KeyedVectors.load(filepath)
-        elif filepath.endswith('.bin'):
-            self.model = KeyedVectors.load_word2vec_format(filepath, binary=True)
+        if filepath.endswith('.npy'):
+            self.vocab = marisa_trie.Trie()
+            if mmap: self.vocab.mmap(trie_path(filepath))
+            else: self.vocab.load(trie_path(filepath))
+            self.vectors = np.load(filepath, mmap_mode=mmap)
+            # the ID of each word in the trie is its row index
+            self.rows = None
         else:
-            raise ValueError('Unknown type: ' + filepath)
+            if filepath.endswith('.gnsm'):
+                model = KeyedVectors.load(filepath, mmap=mmap)
+            elif filepath.endswith('.bin'):
+                model = KeyedVectors.load_word2vec_format(filepath, binary=True)
+            else:
+                raise ValueError('Unknown type: ' + filepath)
+
+            self.vocab, self.rows = vocab_trie({word: v.index for word, v in model.vocab.items()})
+            self.vectors = model.syn0
 
-        self.dim = self.model.syn0.shape[1]
+        self.dim = self.vectors.shape[1]
         self.pad = np.zeros((self.dim,)).astype('float32')
-        print('Init: %s (vocab = %d, dim = %d)' % (filepath, len(self.model.vocab), self.dim))
+        print('Init: %s (vocab = %d, dim = %d)' % (filepath, len(self.vocab), self.dim))
+
+    def index(self, word):
+        """
+        :param word: a word form.
+        :type word: str
+        :return: the row index of the word in self.vectors if exists; otherwise, PAD_ID.
+        :rtype: int
+        """
+        i = self.vocab.get(word, PAD_ID)
+        return i if self.rows is None or i == PAD_ID else int(self.rows[i])
+
+    def export(self, filepath):
+        """
+        Saves the embeddings such that they can be memory-mapped by Word2VecTmp(filepath, mmap='r');
+        the matrix is saved to the filepath and the vocabulary is saved to the corresponding .trie file.
+        :param filepath: the path to the .npy file.
+        :type filepath: str
+        """
+        if not filepath.endswith('.npy'): raise ValueError('Unknown type: ' + filepath)
+        rows = np.arange(len(self.vocab)) if self.rows is None else self.rows
+        np.save(filepath, np.asarray(self.vectors[rows], dtype='float32'))
+        self.vocab.save(trie_path(filepath))
 
     def doc_to_emb(self, document, maxlen):
         """
@@ -197,19 +238,66 @@ class Word2VecTmp:
         """
         def emb(token_index):
             if token_index >= len(document): return self.pad
-            vocab = self.model.vocab.get(document[token_index], None)
-            return self.model.syn0[vocab.index] if vocab else self.pad
+            index = self.index(document[token_index])
+            return self.vectors[index] if index != PAD_ID else self.pad
 
         return np.array([emb(i) for i in range(maxlen)])
         # TODO: the following 3 lines should be replaced by the above return statement
-        # l = [self.model.syn0[0] for _ in range(maxlen-len(document))]
+        # l = [self.vectors[0] for _ in range(maxlen-len(document))]
         # l.extend([emb(i) for i in range(min(maxlen, len(document)))])
         # return np.array(l)
 
+    def docs_to_ids(self, documents, maxlen):
+        """
+        :param documents: a list of documents.
+        :type documents: list of (list of str)
+        :param maxlen: the maximum length of each document (# of tokens).
+        :type maxlen: int
+        :return: the n x maxlen matrix of the row indices in self.vectors, where PAD_ID indicates padding or unknown words.
+        :rtype: numpy.array
+        """
+        ids = np.full((len(documents), maxlen), PAD_ID, dtype='int32')
+        index = self.vocab.get
+
+        for i, document in enumerate(documents):
+            if len(document) > maxlen: document = document[:maxlen]
+            ids[i, :len(document)] = [index(token, PAD_ID) for token in document]
+
+        # map the IDs in the trie to the row indices
+        if self.rows is not None: ids = np.where(ids == PAD_ID, PAD_ID, self.rows[ids])
+        return ids
+
     def docs_to_emb(self, documents, maxlen):
         """
         :param documents: a list of documents.
-        :param maxlen:
-        :return:
+        :type documents: list of (list of str)
+        :param maxlen: the maximum length of each document (# of tokens).
+        :type maxlen: int
+        :return: the n x maxlen x dim tensor of word embeddings, gathered from self.vectors at once.
+        :rtype: numpy.array
         """
-        return np.array([self.doc_to_emb(document, maxlen) for document in documents])
\ No newline at end of file
+        ids = self.docs_to_ids(documents, maxlen)
+        x = np.empty(ids.shape + (self.dim,), dtype='float32')
+        np.take(self.vectors, ids, axis=0, out=x, mode='clip')
+        x[ids == PAD_ID] = 0
+        return x
+
+
+def vocab_trie(vocab):
+    """
+    :param vocab: the mapping from each word to its row index.
+    :type vocab: dict of (str, int)
+    :return: the tuple of (trie of the words, row index of each word by its ID in the trie).
+    :rtype: (marisa_trie.Trie, numpy.array)
+    """
+    trie = marisa_trie.Trie(vocab.keys())
+    rows = np.empty(len(trie), dtype='int32')
+    for word, i in trie.items(): rows[i] = vocab[word]
+    return trie, rows
+
+
+def trie_path(filepath):
+    """
+    :return: the path to the vocabulary trie corresponding to the .npy file.
+    """
+    return filepath[:-len('.npy')] + '.trie'
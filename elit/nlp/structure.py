@@ -13,6 +13,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ========================================================================
+import collections.abc
+import os
+
+import numpy as np
 
 __author__ = 'Jinho D. Choi'
 
@@ -28,6 +32,13 @@ COREF = 'coref'
 SENTIMENT = 'sentiment'
 
 OUT = '-out'
+ATT = '-att'
+
+# the levels of annotations in DocumentBatch (see column_level())
+TOKEN_LEVEL = 'token'
+ATTENTION_LEVEL = 'attention'
+SENTENCE_LEVEL = 'sentence'
+TOKEN_LEVEL_KEYS = {LEMMA, POS, NER, DEPREL, COREF}
 
 class Sentence(dict):
     def __init__(self, d=None):
@@ -52,3 +63,304 @@ class Document(list):
         if l is not None: self.extend(l)
 
 
+class DocumentBatch(object):
+    def __init__(self, buffer, token_bounds, offsets, sentence_bounds, document_bounds,
+                 token_columns=None, sentence_columns=None, attention_lengths=None):
+        """
+        DocumentBatch stores documents in columns: all tokens are concatenated into one UTF-8 buffer and
+        the boundaries of tokens, sentences, and documents are kept in int32 arrays such that no Python object is
+        created per token until a sentence is accessed.
+        :param buffer: the UTF-8 encoded tokens concatenated without delimiters.
+        :type buffer: numpy.array of uint8
+        :param token_bounds: the i'th token is buffer[token_bounds[i]:token_bounds[i+1]] (n_tokens + 1).
+        :type token_bounds: numpy.array of int32
+        :param offsets: the (begin, end) offsets of each token in the original text (n_tokens x 2).
+        :type offsets: numpy.array of int32
+        :param sentence_bounds: the j'th sentence consists of the tokens in [sentence_bounds[j], sentence_bounds[j+1]).
+        :type sentence_bounds: numpy.array of int32
+        :param document_bounds: the k'th document consists of the sentences in [document_bounds[k], document_bounds[k+1]).
+        :type document_bounds: numpy.array of int32
+        :param token_columns: the token-level annotations (e.g., POS ids), whose first dimensions are n_tokens.
+        :type token_columns: dict of (str, numpy.array)
+        :param sentence_columns: the sentence-level annotations (e.g., sentiment scores), whose first dimensions are n_sentences.
+        :type sentence_columns: dict of (str, numpy.array)
+        :param attention_lengths:
+            the number of tokens in the annotation of each sentence for the token columns at ATTENTION_LEVEL,
+            which are transposed from the last axis and padded with zeros up to the sentence lengths (n_sentences).
+        :type attention_lengths: dict of (str, numpy.array)
+        """
+        self.buffer = buffer
+        self.token_bounds = token_bounds
+        self.offsets = offsets
+        self.sentence_bounds = sentence_bounds
+        self.document_bounds = document_bounds
+        self.token_columns = token_columns or {}
+        self.sentence_columns = sentence_columns or {}
+        self.attention_lengths = attention_lengths or {}
+
+    @classmethod
+    def from_documents(cls, documents):
+        """
+        :param documents:
+            the decoded documents, where each sentence contains TOKEN and OFFSET.
+            Other fields become columns at the levels given by column_level(), which must exist in every sentence.
+        :type documents: list of (list of dict)
+        :rtype: DocumentBatch
+        """
+        sentences = [sentence for document in documents for sentence in document]
+        encoded = [token.encode('utf-8') for sentence in sentences for token in sentence[TOKEN]]
+
+        batch = cls(buffer=np.frombuffer(b''.join(encoded), dtype=np.uint8),
+                    token_bounds=bounds(len(t) for t in encoded),
+                    offsets=np.array([o for sentence in sentences for o in sentence[OFFSET]], dtype=np.int32).reshape(-1, 2),
+                    sentence_bounds=bounds(len(sentence[TOKEN]) for sentence in sentences),
+                    document_bounds=bounds(len(document) for document in documents))
+
+        keys = set(key for sentence in sentences for key in sentence) - {TOKEN, OFFSET}
+
+        for key in sorted(keys):
+            for j, sentence in enumerate(sentences):
+                if key not in sentence: raise ValueError('The field %s is missing in the sentence %d' % (key, j))
+
+            values = [np.asarray(sentence[key]) for sentence in sentences]
+            sizes = [len(sentence[TOKEN]) for sentence in sentences]
+            level = column_level(key)
+
+            if level == SENTENCE_LEVEL:
+                if len(set(v.shape for v in values)) > 1:
+                    raise ValueError('The field %s must have the same shape in all sentences' % key)
+                batch.set_column(key, np.stack(values), sentence_level=True)
+            elif level == TOKEN_LEVEL:
+                if any(len(v) != size for v, size in zip(values, sizes)):
+                    raise ValueError('The field %s must have one value per token' % key)
+                batch.set_column(key, concatenate(values))
+            else:
+                values = [np.moveaxis(v, -1, 0) for v in values]
+                lengths = np.array([len(v) for v in values], dtype=np.int32)
+                if any(len(v) > size for v, size in zip(values, sizes)):
+                    raise ValueError('The field %s must not have more values than tokens' % key)
+
+                columns = [np.concatenate((v, np.zeros((size - len(v),) + v.shape[1:], dtype=v.dtype))) for v, size in zip(values, sizes)]
+                batch.set_column(key, concatenate(columns))
+                batch.attention_lengths[key] = lengths
+
+        return batch
+
+    def __len__(self):
+        """
+        :return: the number of documents.
+        :rtype: int
+        """
+        return len(self.document_bounds) - 1
+
+    def __getitem__(self, k):
+        """
+        :return: the k'th document.
+        :rtype: Document of SentenceView
+        """
+        if k < 0: k += len(self)
+        if not 0 <= k < len(self): raise IndexError('document index out of range: %d' % k)
+        return Document(self.sentence(j) for j in range(self.document_bounds[k], self.document_bounds[k+1]))
+
+    def __iter__(self):
+        return (self[k] for k in range(len(self)))
+
+    @property
+    def num_tokens(self):
+        return len(self.token_bounds) - 1
+
+    @property
+    def num_sentences(self):
+        return len(self.sentence_bounds) - 1
+
+    def sentence(self, j):
+        """
+        :return: the view of the j'th sentence across all documents.
+        :rtype: SentenceView
+        """
+        return SentenceView(self, j)
+
+    def tokens(self, begin, end):
+        """
+        :return: the tokens in [begin, end).
+        :rtype: list of str
+        """
+        bounds = self.token_bounds[begin:end+1].tolist()
+        text = self.buffer[bounds[0]:bounds[-1]].tobytes() if bounds else b''
+        b0 = bounds[0] if bounds else 0
+        return [text[b-b0:e-b0].decode('utf-8') for b, e in zip(bounds, bounds[1:])]
+
+    def set_column(self, name, values, sentence_level=False):
+        """
+        :param name: the name of the annotation (e.g., POS, SENTIMENT).
+        :type name: str
+        :param values: the annotations of all tokens, or of all sentences if sentence_level is True.
+        :type values: numpy.array
+        :param sentence_level: if True, the annotations are per sentence; otherwise, per token.
+        :type sentence_level: bool
+        """
+        values = np.asarray(values)
+        size = self.num_sentences if sentence_level else self.num_tokens
+
+        if len(values) != size:
+            raise ValueError('The column %s must have %d rows, not %d' % (name, size, len(values)))
+
+        columns = self.sentence_columns if sentence_level else self.token_columns
+        columns[name] = values
+
+    def to_documents(self):
+        """
+        :return: the documents in the row format, where the annotations are converted to lists.
+        :rtype: list of (list of dict)
+        """
+        return [[sentence.to_dict() for sentence in document] for document in self]
+
+    def save(self, dirpath):
+        """
+        Saves each array in its own .npy file under the directory such that #load() can memory-map them.
+        :param dirpath: the path to the directory.
+        :type dirpath: str
+        """
+        os.makedirs(dirpath, exist_ok=True)
+
+        for name, array in self.arrays().items():
+            np.save(os.path.join(dirpath, name + '.npy'), array)
+
+    @classmethod
+    def load(cls, dirpath, mmap_mode='r'):
+        """
+        :param dirpath: the path to the directory created by #save().
+        :type dirpath: str
+        :param mmap_mode: if 'r', the arrays are memory-mapped such that processes loading the same batch share them.
+        :type mmap_mode: str
+        :rtype: DocumentBatch
+        """
+        arrays = {}
+
+        for filename in os.listdir(dirpath):
+            name, ext = os.path.splitext(filename)
+            if ext == '.npy': arrays[name] = np.load(os.path.join(dirpath, filename), mmap_mode=mmap_mode)
+
+        return cls.from_arrays(arrays)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        :param arrays: the arrays returned by #arrays().
+        :type arrays: dict of (str, numpy.array)
+        :rtype: DocumentBatch
+        """
+        def columns(prefix):
+            return {name[len(prefix):]: array for name, array in arrays.items() if name.startswith(prefix)}
+
+        return cls(arrays['buffer'], arrays['token_bounds'], arrays['offsets'], arrays['sentence_bounds'],
+                   arrays['document_bounds'], columns('token.'), columns('sentence.'), columns('length.'))
+
+    def arrays(self):
+        """
+        :return:
+            all arrays in this batch, where the columns are prefixed by their levels ('token.' or 'sentence.')
+            and the lengths of the attention-level columns are prefixed by 'length.'.
+        :rtype: dict of (str, numpy.array)
+        """
+        arrays = {'buffer': self.buffer,
+                  'token_bounds': self.token_bounds,
+                  'offsets': self.offsets,
+                  'sentence_bounds': self.sentence_bounds,
+                  'document_bounds': self.document_bounds}
+
+        arrays.update(('token.' + name, array) for name, array in self.token_columns.items())
+        arrays.update(('sentence.' + name, array) for name, array in self.sentence_columns.items())
+        arrays.update(('length.' + name, array) for name, array in self.attention_lengths.items())
+        return arrays
+
+    def nbytes(self):
+        """
+        :return: the total number of bytes in the arrays.
+        :rtype: int
+        """
+        return sum(array.nbytes for array in self.arrays().values())
+
+
+class SentenceView(collections.abc.Mapping):
+    def __init__(self, batch, j):
+        """
+        SentenceView behaves like Sentence for the j'th sentence in the batch without copying the batch;
+        tokens and offsets are materialized when they are accessed.
+        :param batch: the batch containing the sentence.
+        :type batch: DocumentBatch
+        :param j: the index of the sentence in the batch.
+        :type j: int
+        """
+        self.batch = batch
+        self.index = j
+        self.begin = int(batch.sentence_bounds[j])
+        self.end = int(batch.sentence_bounds[j+1])
+
+    def __getitem__(self, key):
+        if key == TOKEN: return self.batch.tokens(self.begin, self.end)
+        if key == OFFSET: return [tuple(o) for o in self.batch.offsets[self.begin:self.end].tolist()]
+        if key in self.batch.token_columns:
+            value = self.batch.token_columns[key][self.begin:self.end]
+            lengths = self.batch.attention_lengths.get(key)
+            # restore the layout whose last axis is the tokens
+            return value if lengths is None else np.moveaxis(value[:lengths[self.index]], 0, -1)
+        if key in self.batch.sentence_columns: return self.batch.sentence_columns[key][self.index]
+        raise KeyError(key)
+
+    def __iter__(self):
+        yield TOKEN
+        yield OFFSET
+        yield from self.batch.token_columns
+        yield from self.batch.sentence_columns
+
+    def __len__(self):
+        """
+        :return: the number of tokens as Sentence does.
+        :rtype: int
+        """
+        return self.end - self.begin
+
+    def to_dict(self):
+        """
+        :return: the copy of this sentence as a dictionary, where the annotations are converted to lists.
+        :rtype: dict
+        """
+        return {key: value.tolist() if isinstance(value, np.ndarray) else value for key, value in self.items()}
+
+
+def column_level(key):
+    """
+    :param key: the key to an annotation in sentences.
+    :type key: str
+    :return:
+        TOKEN_LEVEL if the annotation has one value per token (e.g., POS, NER+OUT),
+        ATTENTION_LEVEL if its last axis is the tokens and may be shorter than the sentence (e.g., SENTIMENT-*-att),
+        SENTENCE_LEVEL otherwise (e.g., sentiment scores).
+    :rtype: str
+    """
+    if key in TOKEN_LEVEL_KEYS or key.endswith(OUT): return TOKEN_LEVEL
+    if key.endswith(ATT): return ATTENTION_LEVEL
+    return SENTENCE_LEVEL
+
+
+def concatenate(arrays):
+    """
+    :return: the concatenation of the arrays along the first axis, where empty arrays are skipped since their shapes may not match.
+    :rtype: numpy.array
+    """
+    arrays = [a for a in arrays if len(a)]
+    return np.concatenate(arrays) if arrays else np.zeros(0)
+
+
+def bounds(lengths):
+    """
+    :param lengths: the lengths of consecutive spans.
+    :type lengths: iterator of int
+    :return: the boundaries of the spans, where the i'th span is [bounds[i], bounds[i+1]).
+    :rtype: numpy.array of int32
+    """
+    lengths = np.fromiter(lengths, dtype=np.int32)
+    b = np.zeros(len(lengths) + 1, dtype=np.int32)
+    np.cumsum(lengths, out=b[1:])
+    return b
@@ -24,7 +24,7 @@ import mxnet as mx
 import time
 from mxnet import gluon, nd
 
-from elit.nlp.component import CNN2DModel, NLPComponent, pkl, ForwardState, gln
+from elit.nlp.component import CNN2DModel, NLPComponent, pkl, ForwardState, gln, import_static, SentenceTagger
 from elit.nlp.lexicon import LabelMap, FastText, Word2Vec
 from elit.nlp.metric import F1
 from elit.nlp.structure import TOKEN, NER
@@ -73,7 +73,7 @@ class NERState(ForwardState):
         :return: the n x d matrix where n = # of windows and d = 2 + word_emb.dim + name_emb.dim + num_class
         """
         t = len(self.document[self.sen_id])
-        l = ([x_extract(self.tok_id, w, t, emb[self.sen_id], zero) for w in self.windows] for emb, zero in self.embs)
+        l = [[x_extract(self.tok_id, w, t, emb[self.sen_id], zero) for w in self.windows] for emb, zero in self.embs]
         return np.column_stack(l)
 
 
@@ -82,7 +82,7 @@ class NERModel(CNN2DModel):
         """
         :param params: parameters to initialize POSModel.
         :type params: SimpleNamespace
-        :param kwargs: parameters to initialize gluon.Block.
+        :param kwargs: parameters to initialize gluon.HybridBlock.
         :type kwargs: dict
         """
         loc_dim = len(X_ANY)
@@ -113,7 +113,7 @@ class NERModelLR(gluon.Block):
 
 class NERecognizer(NLPComponent):
     def __init__(self, ctx, word_vsm, name_vsm=None, num_class=17, windows=(-2, -1, 0, 1, 2),
-                 ngram_filters=(128, 128, 128, 128, 128), dropout=0.2, label_map=None, model_path=None):
+                 ngram_filters=(128, 128, 128, 128, 128), dropout=0.2, label_map=None, model_path=None, static=False):
         """
         :param ctx: the context (e.g., CPU or GPU) to process this component.
         :type ctx: mxnet.context.Context
@@ -133,7 +133,11 @@ class NERecognizer(NLPComponent):
         :type label_map: elit.nlp.lexicon.LabelMap
         :param model_path: if not None, this component is initialized by objects saved in the model_path.
         :type model_path: str
+        :param static: if True, the model exported by export() to the model_path is loaded as a static graph for inference only.
+        :type static: bool
         """
+        if static and not model_path: raise ValueError('model_path is required to load the static graph (static=True)')
+
         if model_path:
             f = open(pkl(model_path), 'rb')
             label_map = pickle.load(f)
@@ -144,6 +148,12 @@ class NERecognizer(NLPComponent):
             f.close()
 
         self.params = self.create_params(word_vsm, name_vsm, num_class, windows, ngram_filters, dropout, label_map)
+        self.tagger = None
+
+        if static:
+            super().__init__(ctx, import_static(model_path, ctx))
+            return
+
         super().__init__(ctx, NERModel(self.params))
 
         if model_path:
@@ -163,6 +173,28 @@ class NERecognizer(NLPComponent):
 
         self.model.save_params(gln(filepath))
 
+    def export(self, filepath):
+        """
+        Saves this component together with the static graph of its model such that it can be loaded with static=True.
+        :param filepath: the path to the file to be saved.
+        :type filepath: str
+        """
+        self.save(filepath)
+        self.model.export_static(filepath, len(self.params.windows), self.ctx)
+
+    def tag(self, tokens, scores=False):
+        """
+        Tags one sentence without creating a document or a state, which is faster for short online requests.
+        :param tokens: the tokens in the sentence.
+        :type tokens: list of str
+        :param scores: if True, the prediction scores of the tokens are returned as well.
+        :type scores: bool
+        :return: the predicted labels of the tokens; if scores is True, the tuple of (labels, prediction scores).
+        :rtype: list of str or (list of str, list of numpy.array)
+        """
+        if self.tagger is None: self.tagger = SentenceTagger(self, [self.params.word_vsm, self.params.name_vsm])
+        return self.tagger.tag(tokens, scores)
+
     def create_state(self, document):
         return NERState(document, self.params)
 
@@ -24,7 +24,7 @@ import mxnet as mx
 import numpy as np
 from mxnet import gluon
 
-from elit.nlp.component import ForwardState, NLPComponent, CNN2DModel, pkl, gln
+from elit.nlp.component import ForwardState, NLPComponent, CNN2DModel, pkl, gln, import_static, SentenceTagger
 from elit.nlp.lexicon import LabelMap, FastText, Word2Vec
 from elit.nlp.metric import Accuracy
 from elit.nlp.structure import TOKEN, POS
@@ -66,7 +66,7 @@ class POSState(ForwardState):
         :return: the n x d matrix where n = # of windows and d = word_emb.dim + ambi_emb.dim + num_class + 2
         """
         t = len(self.document[self.sen_id])
-        l = ([x_extract(self.tok_id, w, t, emb[self.sen_id], zero) for w in self.windows] for emb, zero in self.embs)
+        l = [[x_extract(self.tok_id, w, t, emb[self.sen_id], zero) for w in self.windows] for emb, zero in self.embs]
         return np.column_stack(l)
 
 
@@ -75,7 +75,7 @@ class POSModel(CNN2DModel):
         """
         :param params: parameters to initialize POSModel.
         :type params: SimpleNamespace
-        :param kwargs: parameters to initialize gluon.Block.
+        :param kwargs: parameters to initialize gluon.HybridBlock.
         :type kwargs: dict
         """
         loc_dim = len(X_ANY)
@@ -89,7 +89,7 @@ class POSModel(CNN2DModel):
 
 class POSTagger(NLPComponent):
     def __init__(self, ctx, word_vsm, ambi_vsm=None, num_class=50, windows=(-2, -1, 0, 1, 2),
-                 ngram_filters=(128, 128, 128, 128, 128), dropout=0.2, label_map=None, model_path=None):
+                 ngram_filters=(128, 128, 128, 128, 128), dropout=0.2, label_map=None, model_path=None, static=False):
         """
         :param ctx: the context (e.g., CPU or GPU) to process this component.
         :type ctx: mxnet.context.Context
@@ -109,7 +109,11 @@ class POSTagger(NLPComponent):
         :type label_map: elit.nlp.lexicon.LabelMap
         :param model_path: if not None, this component is initialized by objects saved in the model_path.
         :type model_path: str
+        :param static: if True, the model exported by export() to the model_path is loaded as a static graph for inference only.
+        :type static: bool
         """
+        if static and not model_path: raise ValueError('model_path is required to load the static graph (static=True)')
+
         if model_path:
             f = open(pkl(model_path), 'rb')
             label_map = pickle.load(f)
@@ -120,6 +124,12 @@ class POSTagger(NLPComponent):
             f.close()
 
         self.params = self.create_params(word_vsm, ambi_vsm, num_class, windows, ngram_filters, dropout, label_map)
+        self.tagger = None
+
+        if static:
+            super().__init__(ctx, import_static(model_path, ctx))
+            return
+
         super().__init__(ctx, POSModel(self.params))
 
         if model_path:
@@ -139,6 +149,28 @@ class POSTagger(NLPComponent):
 
         self.model.save_params(gln(filepath))
 
+    def export(self, filepath):
+        """
+        Saves this component together with the static graph of its model such that it can be loaded with static=True.
+        :param filepath: the path to the file to be saved.
+        :type filepath: str
+        """
+        self.save(filepath)
+        self.model.export_static(filepath, len(self.params.windows), self.ctx)
+
+    def tag(self, tokens, scores=False):
+        """
+        Tags one sentence without creating a document or a state, which is faster for short online requests.
+        :param tokens: the tokens in the sentence.
+        :type tokens: list of str
+        :param scores: if True, the prediction scores of the tokens are returned as well.
+        :type scores: bool
+        :return: the predicted labels of the tokens; if scores is True, the tuple of (labels, prediction scores).
+        :rtype: list of str or (list of str, list of numpy.array)
+        """
+        if self.tagger is None: self.tagger = SentenceTagger(self, [self.params.word_vsm, self.params.ambi_vsm])
+        return self.tagger.tag(tokens, scores)
+
     def create_state(self, document):
         return POSState(document, self.params)
 
@@ -17,7 +17,7 @@ import abc
 
 import numpy as np
 from keras import backend as K
-from keras.layers import Conv1D, Average, Multiply
+from keras.layers import Conv1D, Average
 from keras.layers import Dense, AveragePooling1D, Input, Lambda
 from keras.models import Model
 import tensorflow as tf
@@ -25,6 +25,34 @@ import tensorflow as tf
 __author__ = 'Bonggun Shin, Jinho D. Choi'
 
 
+def attention_weighted_average(model_input, attention, sz, maxlen):
+    """
+    Averages the token embeddings weighted by the attentions of the n-grams covering them, that is
+    mean_{i, j} (x[:, i+j, :] * attention[:, 0, i] / sz) for every n-gram i and every token j within the n-gram,
+    computed by one matrix multiplication instead of one layer per position.
+    :param model_input: the input tensor of token embeddings (batch x maxlen x dim).
+    :param attention: the attention tensor of the n-grams (batch x 1 x (maxlen - sz + 1)).
+    :param sz: the size of the n-grams.
+    :type sz: int
+    :param maxlen: the maximum number of tokens.
+    :type maxlen: int
+    :return: the tensor of attention-weighted embeddings (batch x dim).
+    """
+    def aux(inputs, sz, maxlen):
+        x, att = inputs
+        attention_size = maxlen - sz + 1
+
+        # the weight of each token is the sum of the attentions of the n-grams covering the token
+        cover = np.zeros((attention_size, maxlen), dtype='float32')
+        for i in range(attention_size): cover[i, i:i+sz] = 1
+        w = K.dot(att[:, 0, :], K.constant(cover))
+
+        return K.sum(K.expand_dims(w) * x, axis=1) / float(attention_size * sz * sz)
+
+    return Lambda(aux, output_shape=lambda shapes: (shapes[0][0], shapes[0][2]),
+                  arguments={'sz': sz, 'maxlen': maxlen})([model_input, attention])
+
+
 class SentimentAnalyzer(object):
     @abc.abstractmethod
     def decode(self, documents):
@@ -40,212 +68,141 @@ class SentimentAnalyzer(object):
 
 
 class CNNSentimentAnalyzer(SentimentAnalyzer):
-    def __init__(self, emb_model, model_path, maxlen=60):
+    def __init__(self, emb_model, model_path, maxlen=60, num_filters=80, hidden_dims=20, filter_sizes=(1, 2, 3, 4, 5)):
+        """
+        :param emb_model: the word embedding model.
+        :type emb_model: elit.nlp.lexicon.Word2VecTmp
+        :param model_path: the path to the saved weights.
+        :type model_path: str
+        :param maxlen: the maximum number of tokens in each document.
+        :type maxlen: int
+        :param num_filters: the number of filters for each n-gram convolution.
+        :type num_filters: int
+        :param hidden_dims: the dimension of the hidden layer.
+        :type hidden_dims: int
+        :param filter_sizes: the n-gram sizes of the convolutions.
+        :type filter_sizes: tuple of int
+        """
         self.emb_model = emb_model
         self.model_path = model_path
         self.maxlen = maxlen
-        self.p_model, self.a_model = self.load_model()
+        self.num_filters = num_filters
+        self.hidden_dims = hidden_dims
+        self.filter_sizes = filter_sizes
+        self.p_model, self.pa_model = self.load_model()
         self.graph = tf.get_default_graph()
 
-    @abc.abstractmethod
-    def prediction_model(self, model_input):
-        return
-
-    @abc.abstractmethod
-    def attention_model(self, model_input):
-        return
-
     def load_model(self):
-        input_shape = (self.maxlen, self.emb_model.dim)
-        model_input = Input(shape=input_shape)
-        p_model = self.prediction_model(model_input)
-        a_model = self.attention_model(model_input)
-
-        for i in range(len(a_model.layers)):
-            a_model.layers[i].set_weights(p_model.layers[i].get_weights())
-
-        return p_model, a_model
-
-    def decode(self, documents, batch_size=2000, att=False):
-        x = self.emb_model.docs_to_emb(documents, self.maxlen)
-
-        with self.graph.as_default():
-            y = self.p_model.predict(x, batch_size=batch_size, verbose=0)
-            all_norm_att = []
-            # all_raw_att = []
-            if not att: return y, all_norm_att
-
-            document_len_list = [len(document) for document in documents]
-            attention_matrix = self.a_model.predict(x, batch_size=batch_size, verbose=0)
-
-            for sample_index in range(len(document_len_list)):
-                sample_norm_att_list = []
-                sample_raw_att_list = []
-                for gram_index in range(5):
-                    sample_raw_att = attention_matrix[gram_index][sample_index][0]
-                    sample_norm_att = sample_raw_att / max(sample_raw_att)
-                    valid_token_start_index = -document_len_list[sample_index] + gram_index
-                    if valid_token_start_index>=0:
-                        valid_token_start_index = len(sample_norm_att)
-
-                    sample_norm_att_list.append(sample_norm_att[valid_token_start_index:])
-                    sample_raw_att_list.append(sample_raw_att[valid_token_start_index:])
-
-                new_norm_att = np.zeros([5, len(sample_norm_att_list[0])])
-                new_norm_att[0, :] = sample_norm_att_list[0]
-
-                new_raw_att = np.zeros([5, len(sample_raw_att_list[0])])
-                new_raw_att[0, :] = sample_raw_att_list[0]
-
-                raw_att_avg = np.zeros([1, len(sample_raw_att_list[0])])
-                for i in range(1, 5):
-                    for j in range(len(sample_norm_att_list[i])):
-                        ngram = i + 1
-                        for n in range(ngram):
-                            if len(sample_norm_att_list[i]) != 0:
-                                new_norm_att[i, j + n] += sample_norm_att_list[i][j] / (ngram)
-                                new_raw_att[i, j + n] += sample_raw_att_list[i][j] / (ngram)
-
-                    if max(new_norm_att[i]) != 0:
-                        new_norm_att[i] = new_norm_att[i] / max(new_norm_att[i])
-
-                raw_att_avg[0] = new_raw_att.sum(0)
-                norm_att_avg = raw_att_avg / max(raw_att_avg[0])
-                all_norm_att.append(np.concatenate((norm_att_avg, new_norm_att), axis=0))
-                # all_raw_att.append(np.concatenate((raw_att_avg, new_raw_att), axis=0))
-
-        return y, all_norm_att
-
-
-class TwitterSentimentAnalyzer(CNNSentimentAnalyzer):
-    def __init__(self, emb_model, model_path):
-        super(TwitterSentimentAnalyzer, self).__init__(emb_model=emb_model, model_path=model_path, maxlen=60)
-
-    def prediction_model(self, model_input):
-        print('Init: '+self.model_path)
-        filter_sizes = (1, 2, 3, 4, 5)
-        num_filters = 80
-        hidden_dims = 20
+        """
+        :return:
+            the tuple of (prediction model, prediction-and-attention model), where both models share the same layers
+            such that the latter returns the predictions and the n-gram attentions from one forward pass.
+        :rtype: (keras.models.Model, keras.models.Model)
+        """
+        print('Init: ' + self.model_path)
+        model_input = Input(shape=(self.maxlen, self.emb_model.dim))
         conv_blocks = []
-        for sz in filter_sizes:
-            conv = Conv1D(num_filters,
+        att_list = []
+
+        for sz in self.filter_sizes:
+            conv = Conv1D(self.num_filters,
                           sz,
                           padding="valid",
                           activation="relu",
                           strides=1)(model_input)
-            print(conv)
             conv = Lambda(lambda x: K.permute_dimensions(x, (0, 2, 1)))(conv)
-            conv = AveragePooling1D(pool_size=num_filters)(conv)
-
-            attention_size = self.maxlen - sz + 1
-
-            multiplied_vector_list = []
-            for i in range(attention_size):
-                selected_attention = Lambda(lambda x: x[:, 0, i] / float(sz))(conv)
-
-                for j in range(sz):
-                    selected_token = Lambda(lambda x: x[:, i + j, :])(model_input)
-                    multiplied_vector = Lambda(lambda x: Multiply()(x))([selected_token, selected_attention])
-
-                    multiplied_vector_list.append(multiplied_vector)
-
-            attentioned_conv = Average()(multiplied_vector_list)
-
-            print(attentioned_conv)
-            conv_blocks.append(attentioned_conv)
+            att = AveragePooling1D(pool_size=self.num_filters)(conv)
+            att_list.append(att)
+            conv_blocks.append(attention_weighted_average(model_input, att, sz, self.maxlen))
 
         z = Average()(conv_blocks)
-        z = Dense(hidden_dims, activation="relu")(z)
+        z = Dense(self.hidden_dims, activation="relu")(z)
         model_output = Dense(3, activation="softmax")(z)
 
-        model = Model(model_input, model_output)
-        model.load_weights(self.model_path)
-        model.compile(loss="sparse_categorical_crossentropy", optimizer="adam")
-
-        return model
+        p_model = Model(model_input, model_output)
+        p_model.load_weights(self.model_path)
+        p_model.compile(loss="sparse_categorical_crossentropy", optimizer="adam")
+        pa_model = Model(model_input, [model_output] + att_list)
 
-    def attention_model(self, model_input):
-        filter_sizes = (1, 2, 3, 4, 5)
-        num_filters = 80
-        att_list = []
-        for sz in filter_sizes:
-            conv = Conv1D(num_filters,
-                          sz,
-                          padding="valid",
-                          activation="relu",
-                          strides=1)(model_input)
-            conv = Lambda(lambda x: K.permute_dimensions(x, (0, 2, 1)))(conv)
-            att = AveragePooling1D(pool_size=num_filters)(conv)
-            att_list.append(att)
+        return p_model, pa_model
 
-        model = Model(model_input, att_list)
-        model.compile(loss="sparse_categorical_crossentropy", optimizer="adam")
+    def decode(self, documents, batch_size=2000, att=False):
+        x = self.emb_model.docs_to_emb(documents, self.maxlen)
 
-        return model
+        with self.graph.as_default():
+            if not att: return self.p_model.predict(x, batch_size=batch_size, verbose=0), []
 
+            # predictions and attentions from the same forward pass
+            outputs = self.pa_model.predict(x, batch_size=batch_size, verbose=0)
+            y, attention_matrix = outputs[0], outputs[1:]
+            all_norm_att = self.normalize_attention(attention_matrix, [len(document) for document in documents])
 
-class MovieSentimentAnalyzer(CNNSentimentAnalyzer):
-    def __init__(self, emb_model, model_path):
-        super(MovieSentimentAnalyzer, self).__init__(emb_model=emb_model, model_path=model_path, maxlen=100)
+        return y, all_norm_att
 
-    def prediction_model(self, model_input):
-        print('Init: ' + self.model_path)
-        filter_sizes = (1, 2, 3, 4, 5)
-        num_filters = 64
-        hidden_dims = 50
-        conv_blocks = []
-        for sz in filter_sizes:
-            conv = Conv1D(num_filters,
-                          sz,
-                          padding="valid",
-                          activation="relu",
-                          strides=1)(model_input)
-            print(conv)
-            conv = Lambda(lambda x: K.permute_dimensions(x, (0, 2, 1)))(conv)
-            conv = AveragePooling1D(pool_size=num_filters)(conv)
+    @staticmethod
+    def normalize_attention(attention_matrix, document_lengths):
+        """
+        Spreads the attention of each n-gram evenly over its tokens and normalizes it by the maximum,
+        where all documents are processed at once.
+        :param attention_matrix: the attention of each n-gram size, where the i'th array is in the shape of n x 1 x (maxlen-i).
+        :type attention_matrix: list of numpy.array
+        :param document_lengths: the number of tokens in each document.
+        :type document_lengths: list of int
+        :return:
+            the list of 6 x min(len, maxlen) matrices, where the first row is the normalized sum of the raw attentions
+            and the i'th row (i > 0) is the normalized attention of the i-grams.
+        :rtype: list of numpy.array
+        """
+        num_grams = len(attention_matrix)
+        lengths = np.asarray(document_lengths)
+        maxlen = attention_matrix[0].shape[2]
+        positions = np.arange(maxlen)
 
-            attention_size = self.maxlen - sz + 1
+        norm_att = np.zeros((len(lengths), num_grams, maxlen))
+        raw_att = np.zeros((len(lengths), num_grams, maxlen))
 
-            multiplied_vector_list = []
-            for i in range(attention_size):
-                selected_attention = Lambda(lambda x: x[:, 0, i] / float(sz))(conv)
+        for i in range(num_grams):
+            raw = attention_matrix[i][:, 0, :]
+            norm = raw / raw.max(axis=1, keepdims=True)
 
-                for j in range(sz):
-                    selected_token = Lambda(lambda x: x[:, i + j, :])(model_input)
-                    multiplied_vector = Lambda(lambda x: Multiply()(x))([selected_token, selected_attention])
+            # the last (length - i) n-grams of each document, moved to the beginning
+            size = raw.shape[1]
+            valid = np.clip(lengths - i, 0, size)[:, None]
+            index = np.minimum(size - valid + positions, size - 1)
+            mask = positions < valid
+            raw = np.where(mask, np.take_along_axis(raw, index, axis=1), 0)
+            norm = np.where(mask, np.take_along_axis(norm, index, axis=1), 0)
 
-                    multiplied_vector_list.append(multiplied_vector)
+            if i == 0:
+                norm_att[:, 0] = norm
+                raw_att[:, 0] = raw
+                continue
 
-            attentioned_conv = Average()(multiplied_vector_list)
+            # spread each n-gram to its tokens in the same order as adding them token by token
+            ngram = i + 1
+            norm = norm / ngram
+            raw = raw / ngram
 
-            print(attentioned_conv)
-            conv_blocks.append(attentioned_conv)
+            for n in reversed(range(ngram)):
+                norm_att[:, i, n:] += norm[:, :maxlen-n]
+                raw_att[:, i, n:] += raw[:, :maxlen-n]
 
-        z = Average()(conv_blocks)
-        z = Dense(hidden_dims, activation="relu")(z)
-        model_output = Dense(3, activation="softmax")(z)
+            m = norm_att[:, i].max(axis=1, keepdims=True)
+            norm_att[:, i] = np.where(m != 0, norm_att[:, i] / np.where(m != 0, m, 1), norm_att[:, i])
 
-        model = Model(model_input, model_output)
-        model.load_weights(self.model_path)
-        model.compile(loss="sparse_categorical_crossentropy", optimizer="adam")
+        raw_att_avg = raw_att.sum(axis=1, keepdims=True)
+        norm_att_avg = raw_att_avg / raw_att_avg.max(axis=2, keepdims=True)
+        all_att = np.concatenate((norm_att_avg, norm_att), axis=1)
+        return [all_att[j, :, :min(length, maxlen)] for j, length in enumerate(lengths)]
 
-        return model
 
-    def attention_model(self, model_input):
-        filter_sizes = (1, 2, 3, 4, 5)
-        num_filters = 64
-        att_list = []
-        for sz in filter_sizes:
-            conv = Conv1D(num_filters,
-                          sz,
-                          padding="valid",
-                          activation="relu",
-                          strides=1)(model_input)
-            conv = Lambda(lambda x: K.permute_dimensions(x, (0, 2, 1)))(conv)
-            att = AveragePooling1D(pool_size=num_filters)(conv)
-            att_list.append(att)
+class TwitterSentimentAnalyzer(CNNSentimentAnalyzer):
+    def __init__(self, emb_model, model_path):
+        super(TwitterSentimentAnalyzer, self).__init__(emb_model=emb_model, model_path=model_path, maxlen=60,
+                                                       num_filters=80, hidden_dims=20)
 
-        model = Model(model_input, att_list)
-        model.compile(loss="sparse_categorical_crossentropy", optimizer="adam")
 
-        return model
+class MovieSentimentAnalyzer(CNNSentimentAnalyzer):
+    def __init__(self, emb_model, model_path):
+        super(MovieSentimentAnalyzer, self).__init__(emb_model=emb_model, model_path=model_path, maxlen=100,
+                                                     num_filters=64, hidden_dims=50)
@@ -14,17 +14,202 @@
 # limitations under the License.
 # ========================================================================
 import abc
+import argparse
 import codecs
+import collections
+import functools
+import hashlib
 import os
+import pickle
 import re
 
+import numpy as np
+
 from elit.nlp.structure import TOKEN, OFFSET
+from elit.util.cache import get_resource
 from elit.util.string import *
 from elit.util.string import is_right_bracket, is_final_mark
 
 __author__ = 'Jinho D. Choi'
 
 
+RE_NON_SPACE = re.compile(r'\S+')
+
+# chunks longer than this (e.g., URLs, log lines) are rarely repeated, so they are not memorized by EnglishTokenizer
+CACHE_MAX_CHUNK = 32
+
+# characters that can start a split in EnglishTokenizer.tokenize_symbol():
+# separators, brackets, double quotes, hyphens, arrows, single quotes, final marks, '#', and currencies
+RE_SYMBOL = re.compile('[,;:~&|/\\[\\](){}<>"\u201C-\u201F\\-\u2010-\u2014\u2190-\u21FF\u27F0-\u27FF\u2900-\u297F'
+                       '\'`\u2018-\u201B.?!\u203C\u2047-\u2049#$\u00A2-\u00A5\u20A0-\u20CF]')
+
+
+# ======================================== Resources ========================================
+
+ENGLISH_WORD_SETS = collections.OrderedDict([
+    ('SET_ABBREVIATION_PERIOD', 'english_abbreviation_period.txt'),
+    ('SET_APOSTROPHE_FRONT', 'english_apostrophe_front.txt'),
+    ('SET_HYPHEN_PREFIX', 'english_hyphen_prefix.txt'),
+    ('SET_HYPHEN_SUFFIX', 'english_hyphen_suffix.txt')])
+ENGLISH_CONCAT_WORDS = 'english_concat_words.txt'
+
+ENGLISH_PATTERNS = collections.OrderedDict([
+    # http:// ftp:// ssh://
+    ('RE_NETWORK_PROTOCOL', r"((http|https|ftp|sftp|ssh|ssl|telnet|smtp|pop3|imap|imap4|sip)(://))"),
+    # :abc:
+    # <3 </3 <\3
+    # (: ): \: *: $: (-: (^: (= (;
+    # :) :( =) B) 8) :-) :^) :3 :D :p :| :(( :---)
+    ('RE_EMOTICON', r"(:\w+:|<[\\/]?3|[\(\)\\\|\*\$][-\^]?[:\=\;]|[:\=\;B8]([-\^]+)?[3DOPp\@\$\*\(\)\\/\|]+)(\W|$)"),
+    # jinho@elit.cloud
+    # jinho.choi@elit.cloud
+    # choi@demo.elit.cloud
+    # jinho:choi@127.0.0.1
+    ('RE_EMAIL', r"[\w\-\.]+(:\S+)?@(([A-Za-z0-9\-]+\.)+[A-Za-z]{2,12}|\d{1,3}(\.\d{1,3}){3})"),
+    # &arrow;
+    # &#123; &#x123; &#X123;
+    ('RE_HTML_ENTITY', r"&([A-Za-z]+|#[Xx]?\d+);"),
+    # [1] (1a) {A} <a1> [***] [A.a] [A.1] [1.a] ((---))
+    ('RE_LIST_ITEM', r"(([\[\(\{\<]+)(\d+[A-Za-z]?|[A-Za-z]\d*|\W+)(\.(\d+|[A-Za-z]))*([\]\)\}\>])+)"),
+    # don't don’t I'll HE'S
+    ('RE_APOSTROPHE', r"(?i)[a-z](n['\u2019]t|['\u2019](ll|nt|re|ve|[dmstz]))(\W|$)"),
+    # a.b.c 1-2-3
+    ('RE_ABBREVIATION', r"[A-Za-z0-9]([\.-][A-Za-z0-9])*$"),
+    # 10kg 1cm
+    ('RE_UNIT', r"(?i)(\d)([acdfkmnpyz]?[mg]|[ap]\.m|ch|cwt|d|drc|ft|fur|gr|h|in|lb|lea|mi|ms|oz|pg|qtr|yd)$"),
+    # hello.World
+    ('RE_FINAL_MARK_IN_BETWEEN', r"([A-Za-z]{3,})([\.\?\!]+)([A-Za-z]{3,})$")])
+
+# the regular expressions tried by EnglishTokenizer.tokenize_regex() in order of precedence and the groups they split off,
+# where None takes the rest of the chunk from the beginning of the match (hyperlinks)
+TOKENIZE_REGEX = collections.OrderedDict([
+    ('RE_HTML_ENTITY', 0),
+    ('RE_EMAIL', 0),
+    ('RE_NETWORK_PROTOCOL', None),
+    ('RE_EMOTICON', 1),
+    ('RE_LIST_ITEM', 0),
+    ('RE_APOSTROPHE', 1)])
+
+# increment the version whenever the format of the bundle changes; older bundles are ignored
+ENGLISH_BUNDLE = 'english_tokenize.bundle'
+ENGLISH_BUNDLE_VERSION = 2
+
+
+def read_english_resource(resource_dir):
+    """
+    :param resource_dir: the path to the directory containing the text files of the resources.
+    :type resource_dir: str
+    :return: the word sets and the concat words read from the text files, and the sources of the regular expressions.
+    :rtype: dict
+    """
+    resource = collections.OrderedDict(
+        (name, read_word_set(os.path.join(resource_dir, filename))) for name, filename in ENGLISH_WORD_SETS.items())
+    resource['MAP_CONCAT_WORD'] = read_concat_word_dict(os.path.join(resource_dir, ENGLISH_CONCAT_WORDS))
+    resource['PATTERNS'] = ENGLISH_PATTERNS
+    return resource
+
+
+def english_resource_digests(resource_dir):
+    """
+    :param resource_dir: the path to the directory containing the text files of the resources.
+    :type resource_dir: str
+    :return: the SHA-1 digest of each text file of the resources in the directory, keyed by its filename.
+    :rtype: dict of (str, str)
+    """
+    digests = {}
+
+    for filename in list(ENGLISH_WORD_SETS.values()) + [ENGLISH_CONCAT_WORDS]:
+        filepath = os.path.join(resource_dir, filename)
+        if not os.path.isfile(filepath): continue
+        with open(filepath, 'rb') as fin:
+            digests[filename] = hashlib.sha1(fin.read()).hexdigest()
+
+    return digests
+
+
+def build_english_bundle(resource_dir, filename=None):
+    """
+    Serializes the word sets, the concat words, and the sources of the regular expressions into one versioned bundle,
+    together with the digests of the text files such that the bundle is ignored once any of them is edited.
+    :param resource_dir: the path to the directory containing the text files of the resources.
+    :type resource_dir: str
+    :param filename: the path to the bundle; if None, the bundle is saved in the resource directory.
+    :type filename: str
+    :return: the path to the bundle.
+    :rtype: str
+    """
+    if filename is None: filename = os.path.join(resource_dir, ENGLISH_BUNDLE)
+    resource = read_english_resource(resource_dir)
+    resource['PATTERNS'] = dict(resource['PATTERNS'])
+
+    with open(filename, 'wb') as fout:
+        pickle.dump((ENGLISH_BUNDLE_VERSION, english_resource_digests(resource_dir), resource), fout,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+
+    print('Bundle: %s' % filename)
+    return filename
+
+
+def load_english_bundle(filename, resource_dir=None):
+    """
+    :param filename: the path to the bundle created by #build_english_bundle().
+    :type filename: str
+    :param resource_dir:
+        if not None, the bundle is checked against the text files in this directory, where files that do not exist
+        are not checked, and against the regular expressions in ENGLISH_PATTERNS.
+    :type resource_dir: str
+    :return: the word sets, the concat words, and the sources of the regular expressions in the bundle.
+    :rtype: dict
+    :raise ValueError: if the bundle is outdated, or if it is stale with respect to the resource directory.
+    """
+    with open(filename, 'rb') as fin:
+        bundle = pickle.load(fin)
+
+    version = bundle[0] if isinstance(bundle, tuple) else None
+    if version != ENGLISH_BUNDLE_VERSION:
+        raise ValueError('Outdated bundle (version=%s, expected=%d): %s' % (version, ENGLISH_BUNDLE_VERSION, filename))
+
+    _, digests, resource = bundle
+
+    if resource_dir is not None:
+        stale = [f for f, d in english_resource_digests(resource_dir).items() if digests.get(f) != d]
+        if resource['PATTERNS'] != dict(ENGLISH_PATTERNS): stale.append('ENGLISH_PATTERNS')
+        if stale: raise ValueError('Stale bundle (changed=%s): %s' % (','.join(stale), filename))
+
+    print('Init: %s(version=%d)' % (filename, version))
+    return resource
+
+
+def english_resource(resource_dir):
+    """
+    Returns the process-wide resource of EnglishTokenizer, which is loaded from the bundle if it is in the resource
+    directory and up-to-date with the text files and the regular expressions; otherwise, from the text files.
+    :param resource_dir: the path to the directory containing resources for tokenization.
+    :type resource_dir: str
+    :return: the word sets, the concat words, and the compiled regular expressions keyed by the attribute names.
+    :rtype: dict
+    """
+    def create():
+        filename = os.path.join(resource_dir, ENGLISH_BUNDLE)
+        resource = None
+
+        if os.path.isfile(filename):
+            try:
+                resource = load_english_bundle(filename, resource_dir)
+            except ValueError as e:
+                print('Skip: %s' % e)
+
+        if resource is None: resource = read_english_resource(resource_dir)
+        patterns = resource.pop('PATTERNS')
+        resource.update((name, re.compile(patterns[name])) for name in ENGLISH_PATTERNS)
+
+        # matches if any regular expression in EnglishTokenizer.tokenize_regex() matches
+        resource['RE_TOKENIZE_REGEX'] = combine_regex(*[resource[name] for name in TOKENIZE_REGEX])
+        return resource
+
+    return get_resource(('tokenize', os.path.abspath(resource_dir)), create)
+
+
 class Tokenizer(object):
     @abc.abstractmethod
     def decode(self, text, offset=0):
@@ -40,6 +225,29 @@ class Tokenizer(object):
         """
         return
 
+    def decode_stream(self, text, offset=0):
+        """
+        :param text: the input text.
+        :type text: str
+        :param offset: the starting offset.
+        :type offset: int
+        :return: the generator yielding the (token, offsets) pair of each token as soon as the token is final.
+        :rtype: generator of (str, (int, int))
+        """
+        tokens, offsets = self.decode(text, offset)[:2]
+        yield from zip(tokens, offsets)
+
+    def decode_windows(self, windows):
+        """
+        :param windows: the iterator of (text, offset) pairs, where each text is a window of a longer text that ends with
+                        whitespace (e.g., elit.decode.iter_windows()) and the offset is the position of the window in it.
+        :type windows: iterator of (str, int)
+        :return: the generator yielding the (token, offsets) pair of each token across all windows.
+        :rtype: generator of (str, (int, int))
+        """
+        for text, offset in windows:
+            yield from self.decode_stream(text, offset)
+
     @staticmethod
     def offsets(text, tokens, offset=0):
         """
@@ -62,93 +270,186 @@ class Tokenizer(object):
         end = 0
         return [get_offset(token) for token in tokens]
 
+    @staticmethod
+    def split(text, offset=0, array=False):
+        """
+        Splits the text by whitespaces, where the offsets are found in the same pass as the tokens.
+        :param text: the input text.
+        :type text: str
+        :param offset: the starting offset.
+        :type offset: int
+        :param array: if True, the offsets are returned as an n x 2 numpy.array of int32.
+        :type array: bool
+        :return: the tuple of (tokens, offsets); see the comments for Tokenizer.offsets() for more details about the offsets.
+        :rtype: (list of str, list of (int, int))
+        """
+        tokens = []
+        spans = []
+
+        for m in RE_NON_SPACE.finditer(text):
+            tokens.append(m.group())
+            spans.append(m.span())
+
+        if array:
+            offsets = np.array(spans, dtype='int32').reshape(-1, 2)
+            if offset: offsets += offset
+        else:
+            offsets = [(begin+offset, end+offset) for begin, end in spans] if offset else spans
+
+        return tokens, offsets
+
 
 class SpaceTokenizer(Tokenizer):
     """
     Tokenize by only spaces.
     """
+    def __init__(self, array=False):
+        """
+        :param array: if True, the offsets are returned as an n x 2 numpy.array of int32.
+        :type array: bool
+        """
+        self.array = array
+
     def decode(self, text, offset=0):
-        tokens = text.split()
-        return tokens, Tokenizer.offsets(text, tokens, offset)
+        return Tokenizer.split(text, offset, self.array)
+
+    def decode_stream(self, text, offset=0):
+        for m in RE_NON_SPACE.finditer(text):
+            yield m.group(), (m.start()+offset, m.end()+offset)
 
 
 class EnglishTokenizer(Tokenizer):
     """
     The default tokenizer for English.
     """
-    def __init__(self, resource_dir):
+    def __init__(self, resource_dir, scanner=False, cache_size=0):
         """
         :param resource_dir: the path to the directory containing resources for tokenization.
         :type resource_dir: str
+        :param scanner:
+            if True, each chunk is tokenized by #tokenize_scan() in one left-to-right pass instead of the recursive
+            rules of #tokenize_aux(), which gives the same tokens and offsets.
+        :type scanner: bool
+        :param cache_size:
+            the maximum number of chunks up to CACHE_MAX_CHUNK characters whose tokens and relative offsets are memorized
+            (least recently used first out); if 0, no chunk is memorized.
+        :type cache_size: int
         """
-        # from resources
-        self.SET_ABBREVIATION_PERIOD = read_word_set(os.path.join(resource_dir, 'english_abbreviation_period.txt'))
-        self.SET_APOSTROPHE_FRONT = read_word_set(os.path.join(resource_dir, 'english_apostrophe_front.txt'))
-        self.MAP_CONCAT_WORD = read_concat_word_dict(os.path.join(resource_dir, 'english_concat_words.txt'))
-        self.SET_HYPHEN_PREFIX = read_word_set(os.path.join(resource_dir, 'english_hyphen_prefix.txt'))
-        self.SET_HYPHEN_SUFFIX = read_word_set(os.path.join(resource_dir, 'english_hyphen_suffix.txt'))
+        self.scanner = scanner
+        self.cache_size = cache_size
+        self._tokenize_aux = self.tokenize_scan if scanner else self.tokenize_aux
+        self._tokenize_chunk = functools.lru_cache(maxsize=cache_size)(self.tokenize_chunk)
 
-        # regular expressions
-        self.RE_NETWORK_PROTOCOL = re.compile(r"((http|https|ftp|sftp|ssh|ssl|telnet|smtp|pop3|imap|imap4|sip)(://))")
-        """
-        # :abc:
-        # <3 </3 <\3
-        # (: ): \: *: $: (-: (^: (= (;
-        # :) :( =) B) 8) :-) :^) :3 :D :p :| :(( :---)
-        """
-        self.RE_EMOTICON = re.compile(r"(:\w+:|<[\\/]?3|[\(\)\\\|\*\$][-\^]?[:\=\;]|[:\=\;B8]([-\^]+)?[3DOPp\@\$\*\(\)\\/\|]+)(\W|$)")
-        """
-        jinho@elit.cloud
-        jinho.choi@elit.cloud
-        choi@demo.elit.cloud
-        jinho:choi@127.0.0.1
-        """
-        self.RE_EMAIL = re.compile(r"[\w\-\.]+(:\S+)?@(([A-Za-z0-9\-]+\.)+[A-Za-z]{2,12}|\d{1,3}(\.\d{1,3}){3})")
-        """
-        &arrow;
-        &#123; &#x123; &#X123;
-        """
-        self.RE_HTML_ENTITY = re.compile(r"&([A-Za-z]+|#[Xx]?\d+);")
-        """
-        # [1] (1a) {A} <a1> [***] [A.a] [A.1] [1.a] ((---))
-        """
-        self.RE_LIST_ITEM = re.compile(r"(([\[\(\{\<]+)(\d+[A-Za-z]?|[A-Za-z]\d*|\W+)(\.(\d+|[A-Za-z]))*([\]\)\}\>])+)")
+        # word sets, concat words, and regular expressions shared by all instances in this process
+        for name, value in english_resource(resource_dir).items():
+            setattr(self, name, value)
+
+        # (regular expression, group) in the order of #tokenize_regex()
+        self._scan_regex = [(getattr(self, name), group) for name, group in TOKENIZE_REGEX.items()]
+
+    def decode(self, text, offset=0):
+        return self.decode_aux(text, offset, self.tokenize_cache if self.cache_size else self._tokenize_aux)
+
+    def decode_aux(self, text, offset, tokenize):
+        tokens = []
+        offsets = []
+
+        # tokenize each chunk between spaces
+        for m in RE_NON_SPACE.finditer(text):
+            tokenize(tokens, offsets, text, m.start(), m.end(), offset)
+
+        return tokens, offsets
+
+    def decode_stream(self, text, offset=0):
+        return self.decode_windows([(text, offset)])
+
+    def decode_windows(self, windows):
         """
-        don't don’t I'll HE'S
+        Tokens are yielded in small batches, where the last two tokens are always held back, even across windows,
+        because #concat_token() can modify them but no other tokens.
         """
-        self.RE_APOSTROPHE = re.compile(r"(?i)[a-z](n['\u2019]t|['\u2019](ll|nt|re|ve|[dmstz]))(\W|$)")
+        tokens = []
+        offsets = []
+        tokenize = self.tokenize_cache if self.cache_size else self._tokenize_aux
+
+        for text, offset in windows:
+            for m in RE_NON_SPACE.finditer(text):
+                tokenize(tokens, offsets, text, m.start(), m.end(), offset)
+
+                if len(tokens) >= 64:
+                    n = len(tokens) - 2
+                    yield from zip(tokens[:n], offsets[:n])
+                    del tokens[:n]
+                    del offsets[:n]
+
+        yield from zip(tokens, offsets)
+
+    def decode_batch(self, texts, offset=0):
         """
-        a.b.c 1-2-3
+        Chunks repeated across the texts are tokenized once per call even if the chunk cache is disabled;
+        they are memorized only during this call.
+        :param texts: the input texts.
+        :type texts: list of str
+        :param offset: the starting offset of each text.
+        :type offset: int
+        :return: the list of (tokens, offsets) for the corresponding texts; see #decode().
+        :rtype: list of (list of str, list of (int, int))
         """
-        self.RE_ABBREVIATION = re.compile(r"[A-Za-z0-9]([\.-][A-Za-z0-9])*$")
+        tokenize = functools.partial(self.tokenize_cache, memo={})
+        return [self.decode_aux(text, offset, tokenize) for text in texts]
+
+    def cache_info(self):
         """
-        10kg 1cm
+        :return: the hits, misses, maxsize, and currsize of the chunk cache.
+        :rtype: functools._CacheInfo
         """
-        self.RE_UNIT = re.compile(r"(?i)(\d)([acdfkmnpyz]?[mg]|[ap]\.m|ch|cwt|d|drc|ft|fur|gr|h|in|lb|lea|mi|ms|oz|pg|qtr|yd)$")
+        return self._tokenize_chunk.cache_info()
+
+    def tokenize_chunk(self, chunk):
         """
-        hello.World
+        :param chunk: the chunk between spaces.
+        :type chunk: str
+        :return:
+            the tuple of (tokens, offsets, concat) of the chunk tokenized in isolation, where the offsets are relative to
+            the chunk and concat is True if the first token may be concatenated with the previous tokens.
+        :rtype: (tuple of str, tuple of (int, int), bool)
         """
-        self.RE_FINAL_MARK_IN_BETWEEN = re.compile(r"([A-Za-z]{3,})([\.\?\!]+)([A-Za-z]{3,})$")
-
-    def decode(self, text, offset=0):
         tokens = []
         offsets = []
+        self._tokenize_aux(tokens, offsets, chunk, 0, len(chunk), 0)
+        return tuple(tokens), tuple(offsets), is_concat_symbol(tokens[0][0])
 
-        # no valid token in the input text
-        if not text or text.isspace(): return tokens, offsets
+    def tokenize_cache(self, tokens, offsets, text, begin, end, offset, memo=None):
+        """
+        Tokenizes the chunk using the cache unless the chunk is longer than CACHE_MAX_CHUNK
+        or can be concatenated with the previous tokens (see #concat_token()).
+        :param memo: if not None, the chunks are memorized in this dictionary before the cache is looked up.
+        :type memo: dict
+        """
+        if end - begin <= CACHE_MAX_CHUNK and (not tokens or not is_concat_symbol(tokens[-1])):
+            chunk = text[begin:end]
+            tokenize_chunk = self._tokenize_chunk if self.cache_size else self.tokenize_chunk
+
+            if memo is None:
+                chunk_tokens, chunk_offsets, concat = tokenize_chunk(chunk)
+            else:
+                result = memo.get(chunk)
+                if result is None: result = memo[chunk] = tokenize_chunk(chunk)
+                chunk_tokens, chunk_offsets, concat = result
+
+            if not concat:
+                begin += offset
+
+                if len(chunk_tokens) == 1:
+                    tokens.append(chunk_tokens[0])
+                    offsets.append((begin, end+offset))
+                else:
+                    tokens.extend(chunk_tokens)
+                    offsets.extend((begin+b, begin+e) for b, e in chunk_offsets)
 
-        # skip beginning and ending spaces
-        begin = next(i for i, c in enumerate(text) if not c.isspace())
-        last = len(text) - next(i for i, c in enumerate(reversed(text)) if not c.isspace())
+                return True
 
-        # search for in-between spaces
-        for end, c in enumerate(text[begin+1:last], begin+1):
-            if c.isspace():
-                self.tokenize_aux(tokens, offsets, text, begin, end, offset)
-                begin = end + 1
-
-        self.tokenize_aux(tokens, offsets, text, begin, last, offset)
-        return tokens, offsets
+        return self._tokenize_aux(tokens, offsets, text, begin, end, offset)
 
     def tokenize_aux(self, tokens, offsets, text, begin, end, offset):
         if begin >= end or end > len(text): return False
@@ -207,14 +508,16 @@ class EnglishTokenizer(Tokenizer):
         return False
 
     def tokenize_symbol(self, tokens, offsets, text, begin, end, offset, token):
-        def index_last_sequence(i, c):
-            final_mark = is_final_mark(c)
+        # the character classes of the token, looked up once instead of per predicate
+        masks = char_class_list(token)
 
-            for j, d in enumerate(token[i+1:], i+1):
-                if final_mark:
-                    if not is_final_mark(d): return j
-                elif c != d:
-                    return j
+        def index_last_sequence(i, c):
+            if masks[i] & CHAR_FINAL_MARK:
+                for j in range(i+1, len(token)):
+                    if not masks[j] & CHAR_FINAL_MARK: return j
+            else:
+                for j in range(i+1, len(token)):
+                    if token[j] != c: return j
 
             return len(token)
 
@@ -223,11 +526,11 @@ class EnglishTokenizer(Tokenizer):
             if c == '-': return i == 0 and is_digit(token, i+1)                                                  # -1
             if c == ',': return is_digit(token, i-1) and is_digit(token, i+1, i+4) and not is_digit(token, i+4)  # 1,000,000
             if c == ':': return is_digit(token, i-1) and is_digit(token, i+1)                                    # 1:2
-            if is_single_quote(c): return is_digit(token, i+1, i+3) and not is_digit(token, i+3)                 # '97
+            if masks[i] & CHAR_SINGLE_QUOTE: return is_digit(token, i+1, i+3) and not is_digit(token, i+3)      # '97
             return False
 
         def split(i, c, p0, p1):
-            if p0(c):
+            if p0(i, c):
                 j = index_last_sequence(i, c)
 
                 if p1(i, j):
@@ -241,18 +544,18 @@ class EnglishTokenizer(Tokenizer):
 
             return False
 
-        def separator_0(c):
+        def separator_0(i, c):
             return c in {',', ';', ':', '~', '&', '|', '/'} or \
-                   is_bracket(c) or is_arrow(c) or is_double_quote(c) or is_hyphen(c)
+                   masks[i] & (CHAR_BRACKET | CHAR_ARROW | CHAR_DOUBLE_QUOTE | CHAR_HYPHEN)
 
-        def edge_symbol_0(c):
-            return is_single_quote(c) or is_final_mark(c)
+        def edge_symbol_0(i, c):
+            return masks[i] & (CHAR_SINGLE_QUOTE | CHAR_FINAL_MARK)
 
-        def currency_like_0(c):
-            return c == '#' or is_currency(c)
+        def currency_like_0(i, c):
+            return c == '#' or masks[i] & CHAR_CURRENCY
 
         def edge_symbol_1(i, j):
-            return i + 1 < j or i == 0 or j == len(token) or is_punct(token[i - 1]) or is_punct(token[j])
+            return i + 1 < j or i == 0 or j == len(token) or masks[i-1] & CHAR_PUNCT or masks[j] & CHAR_PUNCT
 
         def currency_like_1(i, j):
             return i + 1 < j or j == len(token) or token[j].isdigit()
@@ -266,8 +569,124 @@ class EnglishTokenizer(Tokenizer):
 
         return False
 
+    def tokenize_scan(self, tokens, offsets, text, begin, end, offset, level=0):
+        """
+        Tokenizes the chunk in one left-to-right pass that gives the same tokens and offsets as #tokenize_aux().
+        The regular expressions of #tokenize_regex() are searched in the order of precedence from the level, only if
+        their combination matches; the piece of the first one that matches is added and the pass moves onto its right,
+        where the regular expressions before it cannot match, so they never search the rest again.
+        The chunk where none of them matches is split by #scan_symbol().
+        :param level: the index of the first regular expression in TOKENIZE_REGEX that can match in the chunk.
+        :type level: int
+        """
+        if begin >= end or end > len(text): return False
+
+        while begin < end:
+            if end - begin == 1 or text[begin:end].isalnum():
+                self.scan_token(tokens, offsets, text[begin:end], begin, end, offset)
+                return True
+
+            m = self.RE_TOKENIZE_REGEX.search(text, begin, end) if level < len(self._scan_regex) else None
+
+            if m:
+                # none of the regular expressions can match before the combination
+                pos = m.start()
+
+                for level in range(level, len(self._scan_regex)):
+                    regex, group = self._scan_regex[level]
+                    m = regex.search(text, pos, end)
+                    if m: break
+
+            if not m:
+                self.scan_symbol(tokens, offsets, text, begin, end, offset)
+                return True
+
+            idx, lst = m.span(group) if group is not None else (m.start(), end)
+
+            # a regular expression ending with '$' can match at the end of the left part if a word character follows
+            if begin < idx:
+                c = text[idx]
+                self.tokenize_scan(tokens, offsets, text, begin, idx, offset, 0 if c.isalnum() or c == '_' else level+1)
+
+            self.scan_token(tokens, offsets, text[idx:lst], idx, lst, offset)
+            begin = lst
+
+        return True
+
+    def scan_symbol(self, tokens, offsets, text, begin, end, offset):
+        """
+        Splits the chunk, where none of the regular expressions in #tokenize_regex() matches, by symbols in one
+        left-to-right sweep that gives the same tokens as the recursion of #tokenize_symbol(). After each split,
+        the sweep continues from the end of the split symbols as the beginning of the rest, which is the only position
+        whose conditions change in the rest. The end of the left part can only split its trailing single quotes,
+        final marks, and currency-like symbols, which are added one by one after the rest of the left part.
+        """
+        token = text[begin:end]
+        masks = char_class_list(token)
+        n = len(token)
+        s = 0   # the beginning of the rest
+
+        for m in RE_SYMBOL.finditer(token):
+            i = m.start()
+            if i < s: continue
+            c = m.group()
+            mask = masks[i]
+
+            # skip: .1, -1, 1,000,000, 1:2, '97
+            if c == '.':
+                if i + 1 < n and token[i+1].isdigit(): continue
+            elif c == '-':
+                if i == s and i + 1 < n and token[i+1].isdigit(): continue
+            elif c == ',':
+                if i > s and token[i-1].isdigit() and i + 4 <= n and token[i+1:i+4].isdigit() and \
+                   not (i + 4 < n and token[i+4].isdigit()): continue
+            elif c == ':':
+                if i > s and token[i-1].isdigit() and i + 1 < n and token[i+1].isdigit(): continue
+            elif mask & CHAR_SINGLE_QUOTE:
+                if i + 3 <= n and token[i+1:i+3].isdigit() and not (i + 3 < n and token[i+3].isdigit()): continue
+
+            # the end of the sequence
+            j = i + 1
+            if mask & CHAR_FINAL_MARK:
+                while j < n and masks[j] & CHAR_FINAL_MARK: j += 1
+            else:
+                while j < n and token[j] == c: j += 1
+
+            # separators always split; edge symbols and currency-like symbols split on the conditions of #tokenize_symbol()
+            if mask & (CHAR_SINGLE_QUOTE | CHAR_FINAL_MARK):
+                if not (i + 1 < j or i == s or j == n or masks[i-1] & CHAR_PUNCT or masks[j] & CHAR_PUNCT): continue
+            elif c == '#' or mask & CHAR_CURRENCY:
+                if not (i + 1 < j or j == n or token[j].isdigit()): continue
+
+            # the left part, whose trailing edge symbols and currency-like symbols are split one by one
+            k = i
+            while k > s and (masks[k-1] & (CHAR_SINGLE_QUOTE | CHAR_FINAL_MARK | CHAR_CURRENCY) or token[k-1] == '#'): k -= 1
+            if s < k: self.scan_token(tokens, offsets, token[s:k], begin + s, begin + k, offset)
+            for p in range(k, i): self.scan_token(tokens, offsets, token[p], begin + p, begin + p + 1, offset)
+
+            self.scan_token(tokens, offsets, token[i:j], begin + i, begin + j, offset)
+            s = j
+
+        if s < n: self.scan_token(tokens, offsets, token[s:], begin + s, end, offset)
+
+    def scan_token(self, tokens, offsets, token, begin, end, offset):
+        """
+        Adds the token as #add_token() does, where #concat_token() is tried only if the token is '.' or the previous token
+        is a concat symbol, and only the concat words of #split_token() are looked up for a word, a number, or a symbol.
+        """
+        if token == '.' or tokens and is_concat_symbol(tokens[-1]):
+            self.add_token(tokens, offsets, token, begin, end, offset)
+        elif not (token.isalpha() or token.isdigit() or len(token) == 1):
+            if not self.split_token(tokens, offsets, token, begin, end, offset):
+                add_token_aux(tokens, offsets, token, begin, end, offset)
+        elif token.lower() in self.MAP_CONCAT_WORD:
+            self.split_token(tokens, offsets, token, begin, end, offset)
+        else:
+            tokens.append(token)
+            offsets.append((begin+offset, end+offset))
+
     def add_token(self, tokens, offsets, token, begin, end, offset):
-        if not self.concat_token(tokens, offsets, token, end) and \
+        if not self.concat_token(tokens, offsets, token, end+offset) and \
            not self.split_token(tokens, offsets, token, begin, end, offset):
             add_token_aux(tokens, offsets, token, begin, end, offset)
 
@@ -378,11 +797,33 @@ def read_concat_word_dict(filename):
     return d
 
 
+def combine_regex(*regexes):
+    """
+    :param regexes: the compiled regular expressions.
+    :type regexes: list of regex
+    :return:
+        the regular expression that matches wherever any of the input regular expressions matches; if any of them
+        ignores case, the combination ignores case as a whole, so it may match more but never less (a prefilter).
+    :rtype: regex
+    """
+    flags = re.IGNORECASE if any(regex.flags & re.IGNORECASE for regex in regexes) else 0
+    return re.compile('|'.join('(?:%s)' % re.sub(r'^\(\?i\)', '', regex.pattern) for regex in regexes), flags)
+
+
 def add_token_aux(tokens, offsets, token, begin, end, offset):
     tokens.append(token)
     offsets.append((begin+offset, end+offset))
 
 
+def is_concat_symbol(token):
+    """
+    :return: True if the token is a single character that #EnglishTokenizer.concat_token() may concatenate with
+             the neighbouring tokens (a single quote, a hyphen, '.', '&', '|', or '/'); otherwise, False.
+    :rtype: bool
+    """
+    return len(token) == 1 and (token in {'.', '&', '|', '/'} or is_single_quote(token) or is_hyphen(token))
+
+
 def is_digit(token, i, j=None):
     if 0 <= i < len(token):
         if j is None: return token[i].isdigit()
@@ -402,31 +843,74 @@ class Segmenter(object):
         """
         return
 
+    def decode_stream(self, pairs):
+        """
+        :param pairs: the iterator of (token, offsets) pairs (e.g., Tokenizer.decode_stream()).
+        :type pairs: iterator of (str, (int, int))
+        :return: the generator yielding each sentence (see #decode()) as soon as its boundary is confirmed.
+        :rtype: generator of dict
+        """
+        tokens, offsets = [], []
+
+        for token, offset in pairs:
+            tokens.append(token)
+            offsets.append(offset)
+
+        yield from self.decode(tokens, offsets)
+
 
 class EnglishSegmenter(Segmenter):
     def decode(self, tokens, offsets):
-        def sentence(begin, end):
-            return {TOKEN: tokens[begin:end], OFFSET: offsets[begin:end]}
+        return list(self.decode_stream(zip(tokens, offsets)))
 
-        sentences = []
-        begin = 0
+    def decode_stream(self, pairs):
+        """
+        A sentence ending with final marks is held until the next token arrives,
+        which is attached to the sentence if it is a closing bracket or quote.
+        """
+        prev = None
+        tokens, offsets = [], []
         right_quote = True
 
-        for i, token in enumerate(tokens):
+        for token, offset in pairs:
             t = token[0]
             if t == '"': right_quote = not right_quote
 
-            if begin == i:
-                if sentences and (is_right_bracket(t) or t == u'\u201D' or t == '"' and right_quote):
-                    d = sentences[-1]
-                    d[TOKEN].append(token)
-                    d[OFFSET].append(offsets[i])
-                    begin = i + 1
-            elif all(is_final_mark(c) for c in token):
-                sentences.append(sentence(begin, i + 1))
-                begin = i + 1
+            if not tokens:
+                if prev is not None:
+                    if is_right_bracket(t) or t == u'\u201D' or t == '"' and right_quote:
+                        prev[TOKEN].append(token)
+                        prev[OFFSET].append(offset)
+                        continue
+
+                    yield prev
+                    prev = None
+
+                tokens.append(token)
+                offsets.append(offset)
+            else:
+                tokens.append(token)
+                offsets.append(offset)
+
+                if is_final_mark(t) and all(is_final_mark(c) for c in token):
+                    prev = {TOKEN: tokens, OFFSET: offsets}
+                    tokens, offsets = [], []
+
+        if prev is not None: yield prev
+        if tokens: yield {TOKEN: tokens, OFFSET: offsets}
+
+
+# ======================================== Main ========================================
+
+def bundle_args():
+    parser = argparse.ArgumentParser('Build the resource bundle of EnglishTokenizer')
+    parser.add_argument('-r', '--resource_dir', type=str, metavar='filepath', required=True,
+                        help='path to the directory containing resources for tokenization')
+    parser.add_argument('-o', '--output', type=str, metavar='filepath', default=None,
+                        help='path to the bundle (default: resource_dir/%s)' % ENGLISH_BUNDLE)
+    return parser.parse_args()
 
-        if begin < len(tokens):
-            sentences.append(sentence(begin, len(tokens)))
 
-        return sentences
+if __name__ == '__main__':
+    args = bundle_args()
+    build_english_bundle(args.resource_dir, args.output)
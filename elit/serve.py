@@ -0,0 +1,346 @@
+# ========================================================================
+# Copyright 2017 Emory University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========================================================================
+import argparse
+import asyncio
+import collections
+import io
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from urllib.parse import parse_qsl, urlsplit
+
+from elit.decode import EnglishDecoder, read_documents, DOC_MAX_SIZE
+from elit.util.configure import *
+from elit.util.writer import dumps, create_writer
+
+__author__ = 'Jinho D. Choi'
+
+
+HTTP_STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+CONTENT_TYPE = {OUTPUT_FORMAT_JSON: 'application/json',
+                OUTPUT_FORMAT_JSONL: 'application/x-ndjson',
+                OUTPUT_FORMAT_MSGPACK: 'application/msgpack',
+                OUTPUT_FORMAT_NUMPY: 'application/octet-stream'}
+
+
+class Metrics:
+    def __init__(self, window=1000):
+        """
+        Metrics keeps counters and the latencies of the most recent requests.
+        :param window: the number of recent requests used to compute latency percentiles.
+        :type window: int
+        """
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.latencies = collections.deque(maxlen=window)
+
+    def to_dict(self, queue_depth):
+        """
+        :param queue_depth: the number of requests waiting in the queue.
+        :type queue_depth: int
+        :return: the metrics where latencies are in milliseconds.
+        :rtype: dict
+        """
+        latencies = sorted(self.latencies)
+        return {'requests': self.requests,
+                'errors': self.errors,
+                'batches': self.batches,
+                'avg_batch_size': self.requests / self.batches if self.batches else 0,
+                'queue_depth': queue_depth,
+                'latency_p50': 1000 * percentile(latencies, 50),
+                'latency_p99': 1000 * percentile(latencies, 99)}
+
+
+def percentile(values, p):
+    """
+    :param values: the sorted list of values.
+    :type values: list of float
+    :param p: the percentile between 0 and 100.
+    :type p: float
+    :return: the nearest-rank percentile of the values; 0 if the values are empty.
+    """
+    if not values: return 0
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class DecodeServer:
+    def __init__(self, decoder, max_batch=32, max_wait=0.01, max_content_length=DOC_MAX_SIZE):
+        """
+        DecodeServer keeps one warm decoder and coalesces concurrent requests into micro-batches.
+        :param decoder: the decoder shared by all requests.
+        :type decoder: elit.decode.Decoder
+        :param max_batch: the maximum number of requests in each micro-batch.
+        :type max_batch: int
+        :param max_wait: the maximum time in seconds the first request of a micro-batch waits for others.
+        :type max_wait: float
+        :param max_content_length: the maximum size of each request body in bytes.
+        :type max_content_length: int
+        """
+        self.decoder = decoder
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_content_length = max_content_length
+        self.metrics = Metrics()
+        self.queue = None
+        self.batch_task = None
+
+        # the decoder is not thread-safe; all decoding happens in this one thread
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    ############################## DECODING ##############################
+
+    async def submit(self, config, text):
+        """
+        :return: the list of decoded documents for the input text.
+        :rtype: list of (list of dict)
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(SimpleNamespace(config=config, text=text, future=future, time=time.time()))
+        return await future
+
+    async def batch_loop(self):
+        """
+        Collects requests until either max_batch requests are queued or max_wait seconds have passed since
+        the first request, and decodes them together in the executor.
+        """
+        loop = asyncio.get_running_loop()
+
+        while True:
+            requests = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(requests) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0: break
+                try:
+                    requests.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # an unexpected error fails only the requests in this batch; the loop keeps serving the others
+            try:
+                results = await loop.run_in_executor(self.executor, self.decode_batch, requests)
+            except Exception as e:
+                logging.exception('Failed to decode a batch')
+                results = [e] * len(requests)
+
+            self.metrics.batches += 1
+
+            for request, result in zip(requests, results):
+                self.metrics.latencies.append(time.time() - request.time)
+                if request.future.done(): continue
+                if isinstance(result, Exception):
+                    request.future.set_exception(result)
+                else:
+                    request.future.set_result(result)
+
+    def decode_batch(self, requests):
+        """
+        Requests with the same configuration are decoded together so that their documents share model calls.
+        :return: the decoded documents or the raised exception for each request.
+        :rtype: list of (list of (list of dict) or Exception)
+        """
+        def key(config):
+            return config.input_format, config.tokenize, config.segment, tuple(config.sentiment)
+
+        groups = collections.OrderedDict()
+        for i, request in enumerate(requests):
+            groups.setdefault(key(request.config), []).append(i)
+
+        results = [None] * len(requests)
+
+        for indices in groups.values():
+            documents = [list(read_documents(io.StringIO(requests[i].text))) for i in indices]
+
+            try:
+                decoded = self.decoder.decode_documents(requests[indices[0]].config, [d for ds in documents for d in ds])
+            except Exception as e:
+                logging.exception('Failed to decode a batch')
+                for i in indices: results[i] = e
+                continue
+
+            begin = 0
+            for i, ds in zip(indices, documents):
+                results[i] = decoded[begin:begin+len(ds)]
+                begin += len(ds)
+
+        return results
+
+    ############################## HTTP ##############################
+
+    async def handle(self, reader, writer):
+        try:
+            status, body, output_format = await self.respond(reader)
+            content = encode(body, output_format)
+        except (asyncio.IncompleteReadError, ValueError) as e:
+            status, output_format = 400, OUTPUT_FORMAT_JSON
+            content = encode({'errors': [str(e)]}, output_format)
+        except Exception as e:
+            logging.exception('Failed to handle a request')
+            status, output_format = 500, OUTPUT_FORMAT_JSON
+            content = encode({'errors': [str(e)]}, output_format)
+
+        if status != 200: self.metrics.errors += 1
+        header = 'HTTP/1.1 %d %s\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: close\r\n\r\n' % \
+                 (status, HTTP_STATUS[status], CONTENT_TYPE[output_format], len(content))
+        writer.write(header.encode('latin-1') + content)
+
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def respond(self, reader):
+        """
+        :return: the tuple of (HTTP status, body, output format), where the body is serialized by #encode().
+        :rtype: (int, object, str)
+        """
+        method, target, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+        headers = {}
+
+        while True:
+            line = await reader.readline()
+            if line in {b'\r\n', b'\n', b''}: break
+            k, v = line.decode('latin-1').split(':', 1)
+            headers[k.strip().lower()] = v.strip()
+
+        length = int(headers.get('content-length', 0))
+        if length > self.max_content_length: return 413, {'errors': ['request body is too large']}, OUTPUT_FORMAT_JSON
+        body = (await reader.readexactly(length)).decode('utf-8') if length else ''
+        url = urlsplit(target)
+
+        if url.path == '/metrics':
+            return 200, self.metrics.to_dict(self.queue.qsize()), OUTPUT_FORMAT_JSON
+
+        if url.path != '/decode': return 404, {'errors': ['unknown path: ' + url.path]}, OUTPUT_FORMAT_JSON
+        if method not in {'GET', 'POST'}: return 405, {'errors': ['unsupported method: ' + method]}, OUTPUT_FORMAT_JSON
+
+        params = dict(parse_qsl(url.query))
+        if body:
+            if headers.get('content-type', '').startswith('application/json'):
+                values = json.loads(body)
+                if not isinstance(values, dict): return 400, {'errors': ['JSON body must be an object']}, OUTPUT_FORMAT_JSON
+                errors = ['invalid value of %s: %s' % (k, json.dumps(v)) for k, v in values.items() if not is_scalar(v)]
+                if errors: return 400, {'errors': errors}, OUTPUT_FORMAT_JSON
+                params.update((k, to_param(v)) for k, v in values.items())
+            else:
+                params.update(parse_qsl(body))
+
+        config, errors = self.decoder.params_to_config(params)
+        if errors: return 400, {'errors': errors}, OUTPUT_FORMAT_JSON
+
+        self.metrics.requests += 1
+        documents = await self.submit(config, params['text'])
+        return 200, documents, config.output_format
+
+    async def start(self, host, port):
+        """
+        Starts serving requests; returns the asyncio server.
+        """
+        self.queue = asyncio.Queue()
+        self.batch_task = asyncio.get_running_loop().create_task(self.batch_loop())
+        return await asyncio.start_server(self.handle, host, port)
+
+
+def is_scalar(value):
+    """
+    :return: True if the JSON value is a string, a number, or a boolean; otherwise, False.
+    :rtype: bool
+    """
+    return isinstance(value, (str, int, float))
+
+
+def to_param(value):
+    """
+    :return: the JSON value as the string of a query parameter (e.g., 0 -> '0', true -> '1').
+    :rtype: str
+    """
+    if isinstance(value, bool): return '1' if value else '0'
+    return value if isinstance(value, str) else str(value)
+
+
+def encode(body, output_format):
+    """
+    :param body: the JSON body, or the list of decoded documents for the other output formats.
+    :param output_format: the output format (see elit.util.configure).
+    :type output_format: str
+    :return: the body serialized in the output format.
+    :rtype: bytes
+    """
+    if output_format == OUTPUT_FORMAT_JSON: return dumps(body).encode('utf-8')
+    binary = output_format in {OUTPUT_FORMAT_MSGPACK, OUTPUT_FORMAT_NUMPY}
+    ostream = io.BytesIO() if binary else io.StringIO()
+
+    with create_writer(output_format, ostream) as writer:
+        for document in body: writer.write(document)
+
+    content = ostream.getvalue()
+    return content if binary else content.encode('utf-8')
+
+
+# ======================================== Main ========================================
+
+async def serve_forever(server, host, port):
+    """
+    Starts the decode server and serves requests until the task is cancelled.
+    """
+    s = await server.start(host, port)
+    logging.info('Serve: http://%s:%d/decode' % (host, port))
+
+    async with s:
+        await s.serve_forever()
+
+
+def serve_args():
+    parser = argparse.ArgumentParser('Serve: decode over HTTP')
+
+    parser.add_argument('-r', '--resource_dir', type=str, metavar='filepath', help='path to the resource directory')
+    parser.add_argument('-ho', '--host', type=str, metavar='str', default='0.0.0.0', help='host name')
+    parser.add_argument('-p', '--port', type=int, metavar='int', default=8000, help='port number')
+
+    # components loaded at startup; other components are loaded by the first request using them
+    parser.add_argument('-nt', '--no_tokenize', action='store_true', help='do not preload the tokenizer')
+    parser.add_argument('-st', '--sentiment', type=str, metavar='str[,str]*', default='', help='sentiment models to preload (mov, twit)')
+
+    # micro-batching
+    parser.add_argument('-mb', '--max_batch', type=int, metavar='int', default=32, help='maximum number of requests in a batch')
+    parser.add_argument('-mw', '--max_wait', type=float, metavar='float', default=0.01, help='maximum seconds to wait for a batch')
+
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(format='%(message)s', level=logging.INFO)
+    args = serve_args()
+
+    config = Configuration(tokenize=not args.no_tokenize,
+                           sentiment=tuple(filter(None, args.sentiment.split(','))))
+
+    server = DecodeServer(EnglishDecoder(args.resource_dir, config), args.max_batch, args.max_wait)
+
+    try:
+        asyncio.run(serve_forever(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
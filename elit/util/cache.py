@@ -0,0 +1,49 @@
+# ========================================================================
+# Copyright 2017 Emory University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========================================================================
+import threading
+
+__author__ = 'Jinho D. Choi'
+
+
+_resources = {}
+_locks = {}
+_lock = threading.Lock()
+
+
+def get_resource(key, create):
+    """
+    Returns the process-wide resource for the key, creating it on the first request.
+    Concurrent requests for the same key wait for one creation; different keys are created independently.
+    :param key: the key to the resource (e.g., the path to the resource file).
+    :type key: hashable
+    :param create: the function that takes no argument and creates the resource.
+    :type create: () -> object
+    :return: the resource for the key.
+    """
+    resource = _resources.get(key)
+    if resource is not None: return resource
+
+    with _lock:
+        lock = _locks.setdefault(key, threading.Lock())
+
+    with lock:
+        resource = _resources.get(key)
+        if resource is None:
+            resource = create()
+            _resources[key] = resource
+
+    return resource
+
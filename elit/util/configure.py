@@ -23,6 +23,12 @@ LANGUAGE_ENGLISH = 'en'
 INPUT_FORMAT_RAW = 'raw'
 INPUT_FORMAT_LINE = 'line'
 
+# output format
+OUTPUT_FORMAT_JSON = 'json'
+OUTPUT_FORMAT_JSONL = 'jsonl'
+OUTPUT_FORMAT_MSGPACK = 'msgpack'
+OUTPUT_FORMAT_NUMPY = 'npy'
+
 # sentiment analysis
 SENTIMENT_MOVIE = 'mov'
 SENTIMENT_TWITTER = 'twit'
@@ -36,17 +42,23 @@ class Configuration:
                  input_format=INPUT_FORMAT_RAW,
                  tokenize=True,
                  segment=True,
-                 sentiment=()):
+                 sentiment=(),
+                 output_format=OUTPUT_FORMAT_JSON):
         self.language = language
         self.input_format = input_format
         self.tokenize = tokenize
         self.segment = segment
         self.sentiment = sentiment
+        self.output_format = output_format
 
 
 def is_valid_input_format(format):
     return format in {INPUT_FORMAT_RAW, INPUT_FORMAT_LINE}
 
 
+def is_valid_output_format(format):
+    return format in {OUTPUT_FORMAT_JSON, OUTPUT_FORMAT_JSONL, OUTPUT_FORMAT_MSGPACK, OUTPUT_FORMAT_NUMPY}
+
+
 def is_valid_sentiment(sentiment):
     return sentiment in {SENTIMENT_MOVIE, SENTIMENT_TWITTER, SENTIMENT_MOVIE_ATT, SENTIMENT_TWITTER_ATT}
\ No newline at end of file
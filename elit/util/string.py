@@ -13,53 +13,145 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ========================================================================
+import array
 import string
 
+import numpy as np
+
 __author__ = 'Jinho D. Choi'
 
 
+# character classes, where each character can belong to multiple classes
+CHAR_SINGLE_QUOTE = 0x01
+CHAR_DOUBLE_QUOTE = 0x02
+CHAR_LEFT_BRACKET = 0x04
+CHAR_RIGHT_BRACKET = 0x08
+CHAR_HYPHEN = 0x10
+CHAR_ARROW = 0x20
+CHAR_CURRENCY = 0x40
+CHAR_FINAL_MARK = 0x80
+CHAR_PUNCT = 0x100
+CHAR_BRACKET = CHAR_LEFT_BRACKET | CHAR_RIGHT_BRACKET
+
+# all characters with classes are in the basic multilingual plane
+BMP_SIZE = 0x10000
+
+
+def _char_class_table():
+    table = array.array('H', bytes(2 * BMP_SIZE))
+
+    def add(mask, chars=(), ranges=()):
+        for c in chars: table[ord(c)] |= mask
+        for begin, end in ranges:
+            for i in range(ord(begin), ord(end) + 1): table[i] |= mask
+
+    add(CHAR_SINGLE_QUOTE, '\'`', [(u'\u2018', u'\u201B')])
+    add(CHAR_DOUBLE_QUOTE, '"', [(u'\u201C', u'\u201F')])
+    add(CHAR_LEFT_BRACKET, '({[<')
+    add(CHAR_RIGHT_BRACKET, ')}]>')
+    add(CHAR_HYPHEN, '-', [(u'\u2010', u'\u2014')])
+    add(CHAR_ARROW, ranges=[(u'\u2190', u'\u21FF'), (u'\u27F0', u'\u27FF'), (u'\u2900', u'\u297F')])
+    add(CHAR_CURRENCY, '$', [(u'\u00A2', u'\u00A5'), (u'\u20A0', u'\u20CF')])
+    add(CHAR_FINAL_MARK, u'.?!\u203C', [(u'\u2047', u'\u2049')])
+    add(CHAR_PUNCT, string.punctuation)
+    return table
+
+
+# the bitmask of the character classes for each code point in the basic multilingual plane
+CHAR_CLASS_TABLE = _char_class_table()
+_CHAR_CLASS_ARRAY = np.frombuffer(CHAR_CLASS_TABLE, dtype=np.uint16)
+
+
+def char_class(c):
+    """
+    :param c: the character.
+    :type c: str
+    :return: the bitmask of the character classes (e.g., CHAR_HYPHEN | CHAR_PUNCT for '-').
+    :rtype: int
+    """
+    i = ord(c)
+    return CHAR_CLASS_TABLE[i] if i < BMP_SIZE else 0
+
+
+def char_classes(s):
+    """
+    Classifies all characters in the string at once.
+    :param s: the string.
+    :type s: str
+    :return: the bitmask of the character classes for each character in the string (see #char_class()).
+    :rtype: numpy.array of uint16
+    """
+    codepoints = np.frombuffer(s.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    # code points beyond the plane are clipped to U+FFFF, which belongs to no class
+    return _CHAR_CLASS_ARRAY.take(codepoints, mode='clip')
+
+
+def char_class_list(s):
+    """
+    :param s: the string.
+    :type s: str
+    :return: the same bitmasks as #char_classes() in a list, which is faster to build and index for short strings.
+    :rtype: list of int
+    """
+    return [CHAR_CLASS_TABLE[i] if i < BMP_SIZE else 0 for i in map(ord, s)]
+
+
 def is_range(c, begin, end):
     return begin <= c <= end
 
 
+# for strings that are not single characters, the predicates below give the same results as the comparisons
+# that they used before the class table (e.g., is_punct('') is True because '' in string.punctuation)
+
 def is_single_quote(c):
-    return c in {'\'', '`'} or is_range(c, u'\u2018', u'\u201B')
+    if len(c) != 1: return c in {'\'', '`'} or is_range(c, u'\u2018', u'\u201B')
+    return char_class(c) & CHAR_SINGLE_QUOTE != 0
 
 
 def is_double_quote(c):
-    return c == '"' or is_range(c, u'\u201C', u'\u201F')
+    if len(c) != 1: return c == '"' or is_range(c, u'\u201C', u'\u201F')
+    return char_class(c) & CHAR_DOUBLE_QUOTE != 0
 
 
 def is_left_bracket(c):
-    return c in {'(', '{', '[', '<'}
+    if len(c) != 1: return False
+    return char_class(c) & CHAR_LEFT_BRACKET != 0
 
 
 def is_right_bracket(c):
-    return c in {')', '}', ']', '>'}
+    if len(c) != 1: return False
+    return char_class(c) & CHAR_RIGHT_BRACKET != 0
 
 
 def is_bracket(c):
-    return is_left_bracket(c) or is_right_bracket(c)
+    if len(c) != 1: return False
+    return char_class(c) & CHAR_BRACKET != 0
 
 
 def is_hyphen(c):
-    return c == '-' or is_range(c, u'\u2010', u'\u2014')
+    if len(c) != 1: return c == '-' or is_range(c, u'\u2010', u'\u2014')
+    return char_class(c) & CHAR_HYPHEN != 0
 
 
 def is_arrow(c):
-    return is_range(c, u'\u2190', u'\u21FF') or is_range(c, u'\u27F0', u'\u27FF') or is_range(c, u'\u2900', u'\u297F')
+    if len(c) != 1:
+        return is_range(c, u'\u2190', u'\u21FF') or is_range(c, u'\u27F0', u'\u27FF') or is_range(c, u'\u2900', u'\u297F')
+    return char_class(c) & CHAR_ARROW != 0
 
 
 def is_currency(c):
-    return c == '$' or is_range(c, u'\u00A2', u'\u00A5') or is_range(c, u'\u20A0', u'\u20CF')
+    if len(c) != 1: return c == '$' or is_range(c, u'\u00A2', u'\u00A5') or is_range(c, u'\u20A0', u'\u20CF')
+    return char_class(c) & CHAR_CURRENCY != 0
 
 
 def is_final_mark(c):
-    return c in {'.', '?', '!', u'\u203C'} or is_range(c, u'\u2047', u'\u2049')
+    if len(c) != 1: return c in {'.', '?', '!', u'\u203C'} or is_range(c, u'\u2047', u'\u2049')
+    return char_class(c) & CHAR_FINAL_MARK != 0
 
 
 def is_punct(c):
-    return c in string.punctuation
+    if len(c) != 1: return c in string.punctuation
+    return char_class(c) & CHAR_PUNCT != 0
 
 
 def collapse_digits(s):
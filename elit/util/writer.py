@@ -0,0 +1,181 @@
+# ========================================================================
+# Copyright 2017 Emory University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========================================================================
+import abc
+import json
+
+import numpy as np
+
+from elit.nlp.structure import DocumentBatch
+from elit.util.configure import OUTPUT_FORMAT_JSON, OUTPUT_FORMAT_JSONL, OUTPUT_FORMAT_MSGPACK, OUTPUT_FORMAT_NUMPY
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+__author__ = 'Jinho D. Choi'
+
+
+def to_builtin(obj):
+    """
+    Converts numpy values (e.g., scores added to decoded documents by callers) to Python objects for serialization.
+    """
+    if isinstance(obj, (np.ndarray, np.generic)): return obj.tolist()
+    raise TypeError('Object of type %s is not serializable' % type(obj).__name__)
+
+
+def dumps(obj):
+    """
+    :param obj: the object to be serialized (e.g., a decoded document).
+    :return: the JSON string of the object, where numpy values are written as the Python values of their tolist().
+    :rtype: str
+    """
+    return json.dumps(obj, default=to_builtin)
+
+
+class DocumentWriter(object):
+    def __init__(self, ostream):
+        """
+        DocumentWriter serializes decoded documents to the output stream one at a time.
+        :param ostream: either StringIO or File.
+        """
+        self.ostream = ostream
+        self.count = 0
+
+    def write(self, document):
+        """
+        Writes the document to the output stream.
+        :param document: a decoded document (the list of sentences).
+        :type document: list of dict
+        """
+        self._write(document)
+        self.count += 1
+
+    @abc.abstractmethod
+    def _write(self, document):
+        """
+        This is an auxiliary function for #write().
+        """
+        pass
+
+    def close(self):
+        """
+        Finalizes the output; the output stream itself is not closed.
+        """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class JSONWriter(DocumentWriter):
+    """
+    Writes all documents as one well-formed JSON array.
+    """
+    def __init__(self, ostream):
+        super(JSONWriter, self).__init__(ostream)
+        self.ostream.write('[')
+
+    def _write(self, document):
+        if self.count: self.ostream.write(',')
+        self.ostream.write(dumps(document))
+
+    def close(self):
+        self.ostream.write(']')
+
+
+class JSONLinesWriter(DocumentWriter):
+    """
+    Writes each document as a JSON array of its sentences in its own line (http://jsonlines.org).
+    """
+    def _write(self, document):
+        self.ostream.write(dumps(document))
+        self.ostream.write('\n')
+
+
+class MessagePackWriter(DocumentWriter):
+    """
+    Writes each document as a MessagePack array (https://msgpack.org) to the binary output stream,
+    where numbers are stored in binary; read them back with msgpack.Unpacker(istream).
+    """
+    def __init__(self, ostream):
+        if msgpack is None: raise ImportError('msgpack is required for the output format: ' + OUTPUT_FORMAT_MSGPACK)
+        super(MessagePackWriter, self).__init__(ostream)
+        self.packer = msgpack.Packer(default=to_builtin, use_bin_type=True)
+
+    def _write(self, document):
+        self.ostream.write(self.packer.pack(document))
+
+
+class NumpyWriter(DocumentWriter):
+    def __init__(self, ostream, batch_size=1000):
+        """
+        Writes documents in batches to the binary output stream, where each batch is a sequence of .npy arrays
+        of elit.nlp.structure.DocumentBatch such that offsets and scores stay binary; read them back with #read_numpy().
+        :param ostream: the binary output stream.
+        :param batch_size: the number of documents in each batch.
+        :type batch_size: int
+        """
+        super(NumpyWriter, self).__init__(ostream)
+        self.batch_size = batch_size
+        self.documents = []
+
+    def _write(self, document):
+        self.documents.append(document)
+        if len(self.documents) >= self.batch_size: self.flush()
+
+    def flush(self):
+        if not self.documents: return
+        arrays = DocumentBatch.from_documents(self.documents).arrays()
+        np.save(self.ostream, np.array(list(arrays)), allow_pickle=False)
+        for array in arrays.values(): np.save(self.ostream, array, allow_pickle=False)
+        self.documents = []
+
+    def close(self):
+        self.flush()
+
+
+def read_numpy(istream):
+    """
+    :param istream: the binary input stream written by NumpyWriter.
+    :return: the generator yielding each batch of documents.
+    :rtype: generator of elit.nlp.structure.DocumentBatch
+    """
+    while True:
+        try:
+            names = np.load(istream, allow_pickle=False).tolist()
+        except EOFError:
+            return
+
+        yield DocumentBatch.from_arrays({name: np.load(istream, allow_pickle=False) for name in names})
+
+
+def create_writer(output_format, ostream):
+    """
+    :param output_format: the output format (see elit.util.configure).
+    :type output_format: str
+    :param ostream: either StringIO or File for JSON formats; either BytesIO or File in the binary mode for the others.
+    :return: the document writer for the output format.
+    :rtype: DocumentWriter
+    """
+    if output_format == OUTPUT_FORMAT_JSON: return JSONWriter(ostream)
+    if output_format == OUTPUT_FORMAT_JSONL: return JSONLinesWriter(ostream)
+    if output_format == OUTPUT_FORMAT_MSGPACK: return MessagePackWriter(ostream)
+    if output_format == OUTPUT_FORMAT_NUMPY: return NumpyWriter(ostream)
+    raise ValueError('Unknown output format: ' + output_format)
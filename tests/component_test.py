@@ -0,0 +1,220 @@
+# ========================================================================
+# Copyright 2017 Emory University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========================================================================
+import copy
+import random
+import unittest
+import zlib
+from types import SimpleNamespace
+
+import numpy as np
+
+try:
+    import mxnet
+    from mxnet import nd
+    from elit.nlp.component import NLPComponent, SentenceTagger, ForwardBatch
+    from elit.nlp.task.pos import POSState
+except ImportError:
+    mxnet = None
+
+from elit.nlp.lexicon import LabelMap
+from elit.nlp.structure import Document, Sentence, TOKEN
+from elit.nlp.util import X_ANY
+
+__author__ = 'Jinho D. Choi'
+
+
+NUM_CLASS = 7
+WORD_DIM = 8
+
+
+class VectorSpaceModel:
+    """
+    Gives each word a fixed random embedding.
+    """
+    def __init__(self, dim):
+        self.dim = dim
+        self.zero = np.zeros(dim, dtype='float32')
+
+    def get(self, word):
+        return np.random.RandomState(zlib.crc32(word.encode('utf-8'))).rand(self.dim).astype('float32')
+
+    def get_list(self, words):
+        return [self.get(word) for word in words]
+
+
+class Model:
+    """
+    A fixed model whose output depends on every window and every feature of the input.
+    """
+    def __init__(self, num_windows, dim):
+        self.weights = np.random.RandomState(0).randn(num_windows, dim, NUM_CLASS).astype('float32')
+
+    def __call__(self, x):
+        x = x.asnumpy() if hasattr(x, 'asnumpy') else np.asarray(x)
+        return nd.array(np.tanh(np.einsum('nwd,wdc->nc', x, self.weights)))
+
+
+if mxnet is not None:
+    class Component(NLPComponent):
+        def __init__(self, params):
+            dim = len(X_ANY) + params.word_vsm.dim + NUM_CLASS
+            super().__init__(mxnet.cpu(), Model(len(params.windows), dim))
+            self.params = params
+
+        def save(self, filepath):
+            pass
+
+        def create_state(self, document):
+            return POSState(document, self.params)
+
+
+def create_params(windows, num_labels=NUM_CLASS):
+    label_map = LabelMap()
+    for i in range(num_labels): label_map.add('L%d' % i)
+    return SimpleNamespace(label_map=label_map, windows=windows, zero_output=np.zeros(NUM_CLASS, dtype='float32'),
+                           word_vsm=VectorSpaceModel(WORD_DIM), ambi_vsm=None)
+
+
+def create_documents(rng, num_documents, max_sentences, max_tokens):
+    documents = []
+
+    for _ in range(num_documents):
+        document = Document()
+        for _ in range(rng.randint(1, max_sentences)):
+            document.append(Sentence({TOKEN: [rng.choice('abcdefg') for _ in range(rng.randint(1, max_tokens))]}))
+        documents.append(document)
+
+    return documents
+
+
+def decode_previous(model, states, batch_size):
+    """
+    The decoding loop before continuous batching: the features of every state are extracted by POSState.x at each step.
+    """
+    tmp = list(states)
+
+    while tmp:
+        xs = np.array([state.x for state in tmp], dtype='float32')
+
+        for begin in range(0, len(tmp), batch_size):
+            output = model(nd.array(xs[begin:begin + batch_size])).asnumpy()
+            for state, o in zip(tmp[begin:], output): state.process(o)
+
+        tmp = [state for state in tmp if state.has_next()]
+
+
+@unittest.skipIf(mxnet is None, 'mxnet is required')
+class TestForwardDecode(unittest.TestCase):
+    def assertOutputEqual(self, expected, actual):
+        self.assertEqual(len(expected), len(actual))
+        for e, a in zip(expected, actual):
+            np.testing.assert_allclose(np.array(e), np.array(a), rtol=1e-5, atol=1e-6)
+
+    def test_forward_batch(self):
+        rng = random.Random(3)
+
+        for windows in ((-2, -1, 0, 1, 2), (-3, 0, 1)):
+            component = Component(create_params(windows))
+            documents = create_documents(rng, 23, 5, 12)
+            expected = [component.create_state(copy.deepcopy(d)) for d in documents]
+            decode_previous(component.model, expected, 5)
+
+            for batch_size in (1, 5, 100):
+                actual = [component.create_state(copy.deepcopy(d)) for d in documents]
+                component._decode(actual, batch_size)
+
+                for e, a in zip(expected, actual):
+                    self.assertEqual(e.labels, a.labels)
+                    for eo, ao in zip(e.output, a.output): self.assertOutputEqual(eo, ao)
+
+    def test_mixed_lengths(self):
+        rng = random.Random(5)
+        component = Component(create_params((-2, -1, 0, 1, 2)))
+        documents = create_documents(rng, 1, 40, 12) + create_documents(rng, 30, 2, 5)
+        rng.shuffle(documents)
+        expected = [component.create_state(copy.deepcopy(d)) for d in documents]
+        decode_previous(component.model, expected, 5)
+
+        for batch_size in (1, 5, 100):
+            actual = [component.create_state(copy.deepcopy(d)) for d in documents]
+            sizes = sorted(len(state.features()[0]) for state in actual)
+            batch = ForwardBatch(actual, batch_size)
+            indices = batch.active()
+            num_rows = len(batch.table)
+
+            while len(indices):
+                batch.process(indices, component.model(nd.array(batch.x(indices))).asnumpy())
+                indices = batch.active()
+                num_rows = max(num_rows, len(batch.table))
+
+            # the table holds at most the batch_size longest states, not batch_size times the longest one
+            self.assertLessEqual(num_rows, sum(sizes[-batch_size:]))
+            if 1 < batch_size: self.assertLess(num_rows, batch_size * sizes[-1])
+
+            for e, a in zip(expected, actual):
+                self.assertEqual(e.labels, a.labels)
+                for eo, ao in zip(e.output, a.output): self.assertOutputEqual(eo, ao)
+
+    def test_reallocate(self):
+        def document(*lengths):
+            return Document(Sentence({TOKEN: ['a'] * length}) for length in lengths)
+
+        component = Component(create_params((-2, -1, 0, 1, 2)))
+        # the last document has fewer tokens but more rows than the first one, so it does not fit in the first slot,
+        # which is refilled while the third document in the second slot is in progress
+        documents = [document(10), document(9), document(8), document(1, 1, 1, 1, 1)]
+        expected = [component.create_state(copy.deepcopy(d)) for d in documents]
+        decode_previous(component.model, expected, 2)
+
+        actual = [component.create_state(copy.deepcopy(d)) for d in documents]
+        sizes = [len(state.features()[0]) for state in actual]
+        batch = ForwardBatch(actual, 2)
+        indices = batch.active()
+        self.assertEqual(sizes[0] + sizes[1], len(batch.table))
+
+        while len(indices):
+            batch.process(indices, component.model(nd.array(batch.x(indices))).asnumpy())
+            indices = batch.active()
+            if batch.slots[0] is actual[3]: self.assertEqual(sizes[3] + sizes[2], len(batch.table))
+
+        self.assertIs(actual[3], batch.slots[0])
+
+        for e, a in zip(expected, actual):
+            self.assertEqual(e.labels, a.labels)
+            for eo, ao in zip(e.output, a.output): self.assertOutputEqual(eo, ao)
+
+    def test_sentence_tagger(self):
+        rng = random.Random(4)
+
+        for windows in ((-2, -1, 0, 1, 2), (-3, 0, 1)):
+            for num_labels in (NUM_CLASS, 4):
+                component = Component(create_params(windows, num_labels))
+                tagger = SentenceTagger(component, [component.params.word_vsm, None], max_len=3)
+                self.assertEqual([], tagger.tag([]))
+
+                for _ in range(30):
+                    document = create_documents(rng, 1, 2, 9)[0][:1]
+                    state = component.create_state(document)
+                    decode_previous(component.model, [state], 1)
+
+                    labels, scores = tagger.tag(document[0][TOKEN], scores=True)
+                    self.assertEqual(state.labels[0], labels)
+                    self.assertOutputEqual(state.output[0], scores)
+                    self.assertEqual(labels, tagger.tag(document[0][TOKEN]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+# ========================================================================
+# Copyright 2017 Emory University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========================================================================
+import io
+import unittest
+
+from elit.decode import EnglishDecoder, ParallelDecoder, iter_windows, iter_documents, read_documents, DOC_DELIM
+from elit.nlp.structure import TOKEN, OFFSET
+from elit.util.configure import Configuration, INPUT_FORMAT_RAW, INPUT_FORMAT_LINE, OUTPUT_FORMAT_JSONL
+
+__author__ = 'Jinho D. Choi'
+
+
+TEXT = ['Dr. Choi met Mr. Smith at http://elit.cloud/a/b?c=1 yesterday.\n',
+        'They said "hello!!" to everyone :) and left.\n',
+        '\n',
+        'It cost $3.50 (not much); nobody complained.  \n']
+
+
+class TestWindows(unittest.TestCase):
+    def test_iter_windows(self):
+        text = ''.join(TEXT)
+
+        for size in (1, 5, 16, 50, 1000):
+            windows = list(iter_windows(TEXT, size=size))
+            self.assertEqual(text, ''.join(w for w, _ in windows))
+
+            for w, offset in windows:
+                self.assertEqual(w, text[offset:offset+len(w)])
+                self.assertLessEqual(len(w), max(size, len(w)))
+                # windows end at whitespaces unless a token is longer than the size
+                if offset + len(w) < len(text) and not text[offset+len(w)-1].isspace():
+                    self.assertFalse(any(c.isspace() for c in w))
+
+    def test_unicode_whitespace(self):
+        # no-break space, thin space, and ideographic space
+        text = 'http://a.b/c\u00a0http://d.e/f\u2009ghi\u3000jkl'
+        windows = list(iter_windows([text], size=15))
+        self.assertEqual(['http://a.b/c\u00a0', 'http://d.e/f\u2009', 'ghi\u3000jkl'], [w for w, _ in windows])
+        self.assertEqual([0, 13, 26], [o for _, o in windows])
+
+    def test_offset(self):
+        windows = list(iter_windows(['abc def ', 'ghi'], offset=10, size=5))
+        self.assertEqual([('abc ', 10), ('def ', 14), ('ghi', 18)], windows)
+
+    def test_iter_documents(self):
+        text = 'a\nb\n%s\nc\n%s\n%s\nd\n' % (DOC_DELIM, DOC_DELIM, DOC_DELIM)
+        expected = [['a\n', 'b\n'], ['c\n'], [], ['d\n']]
+        self.assertEqual(expected, list(read_documents(io.StringIO(text))))
+        self.assertEqual(expected, [list(lines) for lines in iter_documents(io.StringIO(text))])
+
+        # documents that are not consumed are skipped
+        self.assertEqual(4, len(list(iter_documents(io.StringIO(text)))))
+
+
+class TestWindowedDecode(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(TestWindowedDecode, self).__init__(*args, **kwargs)
+        self.decoder = EnglishDecoder('../resources')
+
+    def test_decode_raw(self):
+        config = Configuration(input_format=INPUT_FORMAT_RAW)
+        text = ''.join(TEXT)
+        expected = self.decoder.decode_raw(config, TEXT)
+        check_offsets(self, text, expected)
+
+        # windows are longer than the longest token
+        for size in (30, 40, 64):
+            windows = iter_windows(TEXT, size=size)
+            self.assertEqual(expected, self.decoder.windows_to_sentences(config, windows))
+
+    def test_decode_line(self):
+        config = Configuration(input_format=INPUT_FORMAT_LINE)
+        sentences = self.decoder.decode_line(config, TEXT)
+        check_offsets(self, ''.join(TEXT), sentences)
+
+        # no sentence is across lines
+        ends = [sum(len(line) for line in TEXT[:i+1]) for i in range(len(TEXT))]
+        for sentence in sentences:
+            self.assertEqual(len(set(next(e for e in ends if begin < e) for begin, _ in sentence[OFFSET])), 1)
+        self.assertEqual('left', sentences[-2][TOKEN][-2])
+
+        # lines are read lazily
+        self.assertEqual(sentences, self.decoder.decode_line(config, iter(TEXT)))
+
+
+class TestResources(unittest.TestCase):
+    def test_tokenizer(self):
+        decoder = EnglishDecoder('../resources')
+        self.assertIs(decoder.tokenizer, EnglishDecoder('../resources').tokenizer)
+        self.assertEqual(0, decoder.tokenizer.cache_size)
+        self.assertEqual(100, EnglishDecoder('../resources', tokenizer_cache_size=100).tokenizer.cache_size)
+
+
+class TestParallelDecoder(unittest.TestCase):
+    def test_parallel_decoder(self):
+        decoder = EnglishDecoder('../resources')
+        config = Configuration()
+        text = ''.join(''.join(TEXT[:i]) + DOC_DELIM + '\n' for i in range(1, len(TEXT) + 1))
+        expected = decoder.decode(config, io.StringIO(text))
+        self.assertEqual(len(TEXT), len(expected))
+
+        with ParallelDecoder('../resources', config, processes=2) as parallel:
+            # documents are yielded in the input order
+            self.assertEqual(expected, list(parallel.iter_decode(config, io.StringIO(text))))
+
+            # the lines of a document can be given lazily (see iter_documents())
+            self.assertEqual(expected[-1], parallel.decode_document(config, iter(TEXT)))
+            lines = next(iter_documents(io.StringIO(text)))
+            self.assertEqual(expected[0], parallel.decode_document(config, lines))
+
+            self.assertEqual(decoder.text_to_sentences(config, TEXT[0], 5), parallel.text_to_sentences(config, TEXT[0], 5))
+
+
+class TestOutputFormat(unittest.TestCase):
+    def test_output_format(self):
+        decoder = EnglishDecoder('../resources')
+        self.assertRaises(ValueError, decoder.decode, Configuration(output_format='xml'), io.StringIO('Hello.'))
+
+        config, errors = decoder.params_to_config({'text': 'Hello.', 'output_format': OUTPUT_FORMAT_JSONL})
+        self.assertEqual(([], OUTPUT_FORMAT_JSONL), (errors, config.output_format))
+        self.assertEqual(['invalid output format: xml'], decoder.params_to_config({'text': 'Hello.', 'output_format': 'xml'})[1])
+
+
+def check_offsets(t, text, sentences):
+    for sentence in sentences:
+        for token, (begin, end) in zip(sentence[TOKEN], sentence[OFFSET]):
+            t.assertEqual(token, text[begin:end])
@@ -0,0 +1,82 @@
+# ========================================================================
+# Copyright 2017 Emory University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========================================================================
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from elit.nlp import lexicon
+from elit.nlp.lexicon import Word2VecTmp, PAD_ID
+
+__author__ = 'Jinho D. Choi'
+
+
+WORDS = ['the', 'cat', 'sat', 'on', 'a', 'mat']
+
+
+def keyed_vectors():
+    """
+    :return: the gensim-like model whose rows are in a different order from the IDs of the words in the trie.
+    """
+    vectors = np.arange(len(WORDS) * 3, dtype='float32').reshape(len(WORDS), 3)
+    return SimpleNamespace(vocab={w: SimpleNamespace(index=i) for i, w in enumerate(WORDS)}, syn0=vectors)
+
+
+class TestWord2VecTmp(unittest.TestCase):
+    def setUp(self):
+        model = keyed_vectors()
+        self.vectors = model.syn0
+
+        with mock.patch.object(lexicon, 'KeyedVectors', SimpleNamespace(load=lambda filepath, mmap=None: model)):
+            self.emb = Word2VecTmp('words.gnsm')
+
+    def check(self, emb):
+        for i, word in enumerate(WORDS):
+            np.testing.assert_array_equal(self.vectors[i], emb.vectors[emb.index(word)])
+        self.assertEqual(PAD_ID, emb.index('dog'))
+
+        documents = [['the', 'dog', 'sat'], ['a', 'mat', 'on', 'the', 'cat']]
+        ids = emb.docs_to_ids(documents, 4)
+        self.assertEqual([[emb.index(w) for w in d[:4]] + [PAD_ID] * (4 - len(d)) for d in documents], ids.tolist())
+
+        x = emb.docs_to_emb(documents, 4)
+        for i, document in enumerate(documents):
+            for j in range(4):
+                expected = self.vectors[WORDS.index(document[j])] if j < len(document) and document[j] in WORDS else emb.pad
+                np.testing.assert_array_equal(expected, x[i, j])
+
+    def test_gnsm(self):
+        self.assertEqual(len(WORDS), len(self.emb.vocab))
+        self.assertEqual(list(range(len(WORDS))), [self.emb.index(word) for word in WORDS])
+        self.check(self.emb)
+
+    def test_export(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filepath = os.path.join(tmp, 'words.npy')
+            self.emb.export(filepath)
+
+            for mmap in (None, 'r'):
+                emb = Word2VecTmp(filepath, mmap)
+                self.assertIsNone(emb.rows)
+                self.check(emb)
+                del emb
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+# ========================================================================
+# Copyright 2017 Emory University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========================================================================
+import unittest
+import warnings
+
+import numpy as np
+
+from elit.nlp.task.sentiment import CNNSentimentAnalyzer
+
+__author__ = 'Jinho D. Choi'
+
+
+def normalize_attention_loop(attention_matrix, document_len_list):
+    """
+    The per-document loop that CNNSentimentAnalyzer.normalize_attention() replaced.
+    """
+    all_norm_att = []
+
+    for sample_index in range(len(document_len_list)):
+        sample_norm_att_list = []
+        sample_raw_att_list = []
+        for gram_index in range(5):
+            sample_raw_att = attention_matrix[gram_index][sample_index][0]
+            sample_norm_att = sample_raw_att / max(sample_raw_att)
+            valid_token_start_index = -document_len_list[sample_index] + gram_index
+            if valid_token_start_index >= 0:
+                valid_token_start_index = len(sample_norm_att)
+
+            sample_norm_att_list.append(sample_norm_att[valid_token_start_index:])
+            sample_raw_att_list.append(sample_raw_att[valid_token_start_index:])
+
+        new_norm_att = np.zeros([5, len(sample_norm_att_list[0])])
+        new_norm_att[0, :] = sample_norm_att_list[0]
+
+        new_raw_att = np.zeros([5, len(sample_raw_att_list[0])])
+        new_raw_att[0, :] = sample_raw_att_list[0]
+
+        raw_att_avg = np.zeros([1, len(sample_raw_att_list[0])])
+        for i in range(1, 5):
+            for j in range(len(sample_norm_att_list[i])):
+                ngram = i + 1
+                for n in range(ngram):
+                    if len(sample_norm_att_list[i]) != 0:
+                        new_norm_att[i, j + n] += sample_norm_att_list[i][j] / (ngram)
+                        new_raw_att[i, j + n] += sample_raw_att_list[i][j] / (ngram)
+
+            if max(new_norm_att[i]) != 0:
+                new_norm_att[i] = new_norm_att[i] / max(new_norm_att[i])
+
+        raw_att_avg[0] = new_raw_att.sum(0)
+        norm_att_avg = raw_att_avg / max(raw_att_avg[0])
+        all_norm_att.append(np.concatenate((norm_att_avg, new_norm_att), axis=0))
+
+    return all_norm_att
+
+
+class TestNormalizeAttention(unittest.TestCase):
+    def check(self, attention_matrix, lengths):
+        with warnings.catch_warnings():
+            # rows of all zeros are divided by their maximum in both implementations
+            warnings.simplefilter('ignore', RuntimeWarning)
+            expected = normalize_attention_loop(attention_matrix, lengths)
+            actual = CNNSentimentAnalyzer.normalize_attention(attention_matrix, lengths)
+
+        self.assertEqual(len(expected), len(actual))
+        for e, a in zip(expected, actual):
+            np.testing.assert_array_equal(e, a)
+
+    def test_random(self):
+        rng = np.random.RandomState(0)
+
+        for maxlen in (8, 60):
+            for _ in range(20):
+                n = rng.randint(1, 10)
+                lengths = rng.randint(1, maxlen + 5, size=n).tolist()
+                attention_matrix = [rng.rand(n, 1, maxlen - i).astype(np.float32) for i in range(5)]
+                self.check(attention_matrix, lengths)
+
+    def test_zeros_and_ties(self):
+        rng = np.random.RandomState(1)
+        maxlen = 12
+        lengths = [1, 2, 3, 5, 12, 20]
+
+        # few distinct values give ties for the maximum
+        attention_matrix = [rng.randint(0, 3, size=(len(lengths), 1, maxlen - i)).astype(np.float32) for i in range(5)]
+
+        # rows of all zeros, for one n-gram size and for all of them
+        attention_matrix[2][1] = 0
+        for a in attention_matrix: a[3] = 0
+
+        self.check(attention_matrix, lengths)
+
+    def test_empty(self):
+        # the loop fails on empty documents, which get no attention
+        attention_matrix = [np.ones((2, 1, 8 - i), dtype=np.float32) for i in range(5)]
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            att = CNNSentimentAnalyzer.normalize_attention(attention_matrix, [0, 2])
+
+        self.assertEqual([(6, 0), (6, 2)], [a.shape for a in att])
+
+
+if __name__ == '__main__':
+    unittest.main()
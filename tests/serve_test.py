@@ -0,0 +1,166 @@
+# ========================================================================
+# Copyright 2017 Emory University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========================================================================
+import asyncio
+import json
+import sys
+import unittest
+from types import SimpleNamespace
+
+from elit.util.configure import OUTPUT_FORMAT_JSON, is_valid_output_format
+
+if sys.version_info >= (3, 7):
+    from elit.serve import DecodeServer
+
+__author__ = 'Jinho D. Choi'
+
+
+class StubDecoder:
+    """
+    Echoes each document as one sentence of its lines and records the documents decoded in each call.
+    """
+    def __init__(self):
+        self.calls = []
+
+    def params_to_config(self, params):
+        if not params.get('text'): return None, ['input text is missing']
+        output_format = params.get('output_format', OUTPUT_FORMAT_JSON)
+        if not is_valid_output_format(output_format): return None, ['invalid output format: ' + output_format]
+        return SimpleNamespace(input_format='raw', tokenize=params.get('tokenize', '1') == '1', segment=True, sentiment=(),
+                               output_format=output_format), []
+
+    def decode_documents(self, config, documents):
+        self.calls.append((config.tokenize, len(documents)))
+        return [[{'tok': [line.strip() for line in document]}] for document in documents]
+
+
+async def request(port, method, target, body=b'', headers=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    lines = ['%s %s HTTP/1.1' % (method, target), 'Host: localhost', 'Content-Length: %d' % len(body)]
+    if headers: lines.extend('%s: %s' % (k, v) for k, v in headers.items())
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+    await writer.drain()
+
+    response = await reader.read()
+    writer.close()
+    head, content = response.split(b'\r\n\r\n', 1)
+    status = int(head.split(b' ', 2)[1])
+    if b'Content-Type: application/json' not in head: return status, content
+    return status, json.loads(content.decode('utf-8'))
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'elit.serve requires Python 3.7+')
+class TestDecodeServer(unittest.TestCase):
+    def run_server(self, test, **kwargs):
+        async def main():
+            server = DecodeServer(self.decoder, **kwargs)
+            s = await server.start('127.0.0.1', 0)
+
+            try:
+                await test(s.sockets[0].getsockname()[1], server)
+            finally:
+                server.batch_task.cancel()
+                s.close()
+                await s.wait_closed()
+                server.executor.shutdown()
+
+        asyncio.run(main())
+
+    def setUp(self):
+        self.decoder = StubDecoder()
+
+    def test_micro_batch(self):
+        async def test(port, server):
+            responses = await asyncio.gather(
+                request(port, 'GET', '/decode?text=a%0Ab'),
+                request(port, 'POST', '/decode', b'text=c&tokenize=0', {'Content-Type': 'application/x-www-form-urlencoded'}),
+                request(port, 'POST', '/decode', json.dumps({'text': 'd'}).encode('utf-8'), {'Content-Type': 'application/json'}))
+
+            self.assertEqual([(200, [[{'tok': ['a', 'b']}]]), (200, [[{'tok': ['c']}]]), (200, [[{'tok': ['d']}]])], responses)
+            self.assertEqual(1, server.metrics.batches)
+            self.assertEqual([(True, 2), (False, 1)], self.decoder.calls)
+
+        self.run_server(test, max_batch=3, max_wait=5)
+
+    def test_output_format(self):
+        async def test(port, server):
+            status, content = await request(port, 'GET', '/decode?text=a%0Ab&output_format=jsonl')
+            self.assertEqual(200, status)
+            self.assertEqual(b'[{"tok": ["a", "b"]}]\n', content)
+            self.assertEqual(400, (await request(port, 'GET', '/decode?text=a&output_format=xml'))[0])
+
+        self.run_server(test, max_wait=0)
+
+    def test_errors(self):
+        async def test(port, server):
+            self.assertEqual(413, (await request(port, 'POST', '/decode', b'text=' + b'a' * 16))[0])
+            self.assertEqual(404, (await request(port, 'GET', '/unknown'))[0])
+            self.assertEqual(405, (await request(port, 'PUT', '/decode?text=a'))[0])
+            self.assertEqual(400, (await request(port, 'GET', '/decode'))[0])
+            self.assertEqual([], self.decoder.calls)
+
+        self.run_server(test, max_content_length=8)
+
+    def test_json_values(self):
+        async def test(port, server):
+            headers = {'Content-Type': 'application/json'}
+            status, body = await request(port, 'POST', '/decode', b'{"text": "Hi there.", "tokenize": 0}', headers)
+            self.assertEqual((200, [[{'tok': ['Hi there.']}]]), (status, body))
+            self.assertEqual([(False, 1)], self.decoder.calls)
+
+            status, body = await request(port, 'POST', '/decode', b'{"text": "Hi there.", "tokenize": true}', headers)
+            self.assertEqual(200, status)
+            self.assertEqual((True, 1), self.decoder.calls[-1])
+
+            for content in (b'{"text": ["Hi there."]}', b'{"text": "Hi", "segment": null}', b'["Hi there."]'):
+                self.assertEqual(400, (await request(port, 'POST', '/decode', content, headers))[0])
+
+            self.assertEqual(2, len(self.decoder.calls))
+
+        self.run_server(test, max_wait=0)
+
+    def test_failed_batch(self):
+        async def test(port, server):
+            decode_batch = server.decode_batch
+
+            def fail_once(requests):
+                server.decode_batch = decode_batch
+                raise RuntimeError('unexpected')
+
+            server.decode_batch = fail_once
+            self.assertEqual((500, {'errors': ['unexpected']}), await request(port, 'GET', '/decode?text=a'))
+            self.assertEqual((200, [[{'tok': ['b']}]]), await request(port, 'GET', '/decode?text=b'))
+            self.assertEqual(2, server.metrics.batches)
+
+        self.run_server(test, max_wait=0)
+
+    def test_metrics(self):
+        async def test(port, server):
+            await request(port, 'GET', '/decode?text=a')
+            await request(port, 'GET', '/unknown')
+            status, metrics = await request(port, 'GET', '/metrics')
+
+            self.assertEqual(200, status)
+            self.assertEqual(1, metrics['requests'])
+            self.assertEqual(1, metrics['errors'])
+            self.assertEqual(1, metrics['batches'])
+            self.assertEqual(0, metrics['queue_depth'])
+            self.assertGreater(metrics['latency_p50'], 0)
+
+        self.run_server(test, max_wait=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
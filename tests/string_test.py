@@ -0,0 +1,53 @@
+# ========================================================================
+# Copyright 2017 Emory University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========================================================================
+import unittest
+
+from elit.util.string import is_single_quote, is_double_quote, is_bracket, is_hyphen, is_arrow, is_currency, \
+    is_final_mark, is_punct, char_classes, char_class_list, CHAR_HYPHEN, CHAR_PUNCT
+
+__author__ = 'Jinho D. Choi'
+
+
+class TestCharPredicates(unittest.TestCase):
+    def test_char(self):
+        self.assertTrue(is_single_quote('’'))
+        self.assertTrue(is_double_quote('“'))
+        self.assertTrue(is_bracket('<'))
+        self.assertTrue(is_hyphen('—'))
+        self.assertTrue(is_arrow('⟰'))
+        self.assertTrue(is_currency('€'))
+        self.assertTrue(is_final_mark('‼'))
+        self.assertTrue(is_punct('#'))
+        self.assertFalse(is_punct('a'))
+        self.assertFalse(is_punct('\U0001F600'))
+
+    def test_not_char(self):
+        # strings that are not single characters are compared as strings
+        self.assertTrue(is_punct(''))
+        self.assertTrue(is_punct('!"'))
+        self.assertFalse(is_punct('ab'))
+        self.assertFalse(is_hyphen(''))
+        self.assertTrue(is_hyphen('‐a'))
+        self.assertFalse(is_bracket('()'))
+
+    def test_char_classes(self):
+        s = 'a-\U0001F600.'
+        self.assertEqual(char_class_list(s), char_classes(s).tolist())
+        self.assertEqual(CHAR_HYPHEN | CHAR_PUNCT, char_class_list(s)[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
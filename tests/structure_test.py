@@ -0,0 +1,118 @@
+# ========================================================================
+# Copyright 2017 Emory University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========================================================================
+import tempfile
+import unittest
+
+import numpy as np
+
+from elit.nlp.structure import TOKEN, OFFSET, POS, NER, OUT, Sentence, Document, DocumentBatch
+
+__author__ = 'Jinho D. Choi'
+
+
+def sentence(tokens, begin=0, **fields):
+    offsets, b = [], begin
+    for t in tokens:
+        offsets.append((b, b + len(t)))
+        b += len(t) + 1
+
+    d = {TOKEN: tokens, OFFSET: offsets}
+    d.update(fields)
+    return Sentence(d)
+
+
+DOCUMENTS = [
+    Document([sentence(['John', 'bought', 'a', 'café', '.'], pos=['NNP', 'VBD', 'DT', 'NN', '.']),
+              sentence(['It', 'was', '€5', '.'], 20, pos=['PRP', 'VBD', 'NN', '.'])]),
+    Document(),
+    Document([sentence([], 0, pos=[]),
+              sentence(['Hi'], 0, pos=['UH'])])]
+
+
+def as_dict(s):
+    return {key: list(value) if key == OFFSET else value for key, value in s.items()}
+
+
+class TestDocumentBatch(unittest.TestCase):
+    def assertBatch(self, documents, batch):
+        self.assertEqual(len(documents), len(batch))
+        self.assertEqual(sum(len(d) for d in documents), batch.num_sentences)
+        self.assertEqual(sum(len(s) for d in documents for s in d), batch.num_tokens)
+
+        for document, view in zip(documents, batch):
+            self.assertEqual(len(document), len(view))
+
+            for s, v in zip(document, view):
+                self.assertEqual(len(s), len(v))
+                self.assertEqual(s[TOKEN], v[TOKEN])
+                self.assertEqual(s[OFFSET], v[OFFSET])
+                self.assertEqual(as_dict(s), v.to_dict())
+
+    def test_from_documents(self):
+        batch = DocumentBatch.from_documents(DOCUMENTS)
+        self.assertBatch(DOCUMENTS, batch)
+        self.assertEqual(DOCUMENTS[-1][-1][TOKEN], batch[-1][-1][TOKEN])
+        self.assertRaises(IndexError, batch.__getitem__, len(DOCUMENTS))
+        self.assertEqual([as_dict(s) for d in DOCUMENTS for s in d], [s for d in batch.to_documents() for s in d])
+
+    def test_empty(self):
+        for documents in ([], [Document()], [Document([sentence([])])]):
+            batch = DocumentBatch.from_documents(documents)
+            self.assertBatch(documents, batch)
+            self.assertBatch(documents, DocumentBatch.from_arrays(batch.arrays()))
+
+    def test_columns(self):
+        documents = [Document([sentence(['a', 'b'], **{NER + OUT: [[0.1, 0.9], [0.8, 0.2]], 'score': [1.0, 0.0],
+                                                        'score-att': [[0.5], [1.0]]}),
+                               sentence(['c'], **{NER + OUT: [[1.0, 0.0]], 'score': [0.0, 1.0],
+                                                  'score-att': [[1.0], [1.0]]})])]
+        batch = DocumentBatch.from_documents(documents)
+        self.assertEqual((3, 2), batch.token_columns[NER + OUT].shape)
+        self.assertEqual((2, 2), batch.sentence_columns['score'].shape)
+
+        # attentions are stored per token and restored in the original layout
+        self.assertEqual((3, 2), batch.token_columns['score-att'].shape)
+        self.assertEqual((2, 1), batch[0][0]['score-att'].shape)
+        self.assertBatch(documents, batch)
+
+        # every sentence must have the same fields
+        del documents[0][1]['score']
+        self.assertRaises(ValueError, DocumentBatch.from_documents, documents)
+
+        batch.set_column(POS, ['x', 'y', 'z'])
+        self.assertEqual(['x', 'y'], batch[0][0][POS].tolist())
+        self.assertRaises(ValueError, batch.set_column, POS, ['x'])
+
+    def test_arrays(self):
+        batch = DocumentBatch.from_documents(DOCUMENTS)
+        arrays = batch.arrays()
+        self.assertEqual({'buffer', 'token_bounds', 'offsets', 'sentence_bounds', 'document_bounds', 'token.pos'}, set(arrays))
+        self.assertEqual(sum(a.nbytes for a in arrays.values()), batch.nbytes())
+        self.assertBatch(DOCUMENTS, DocumentBatch.from_arrays(arrays))
+
+    def test_save_load(self):
+        batch = DocumentBatch.from_documents(DOCUMENTS)
+
+        with tempfile.TemporaryDirectory() as dirpath:
+            batch.save(dirpath)
+            loaded = DocumentBatch.load(dirpath)
+            self.assertIsInstance(loaded.buffer, np.memmap)
+            self.assertIsInstance(loaded.token_columns[POS], np.memmap)
+            self.assertBatch(DOCUMENTS, loaded)
+
+            loaded = DocumentBatch.load(dirpath, mmap_mode=None)
+            self.assertNotIsInstance(loaded.buffer, np.memmap)
+            self.assertBatch(DOCUMENTS, loaded)
@@ -13,9 +13,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ========================================================================
+import os
+import random
+import shutil
+import tempfile
 import unittest
 
-from elit.nlp.task.tokenize import SpaceTokenizer, EnglishTokenizer
+from elit.nlp.structure import TOKEN, OFFSET
+from elit.nlp.task.tokenize import SpaceTokenizer, EnglishTokenizer, EnglishSegmenter, build_english_bundle, \
+    load_english_bundle, read_english_resource, CACHE_MAX_CHUNK
 
 __author__ = 'Jinho D. Choi'
 
@@ -170,6 +176,9 @@ class TestEnglishTokenizer(unittest.TestCase):
         tokenizer_helper(self, 'Hello, world!', ['Hello', ',', 'world', '!'],
                          [(5, 10), (10, 11), (12, 17), (17, 18)], 5)
 
+        # concatenated tokens
+        tokenizer_helper(self, 'U.S. and Ph.D.', ['U.S.', 'and', 'Ph.D.'], [(5, 9), (10, 13), (14, 19)], 5)
+
         # def test_segment(self):
         #     tokens, offsets = self.tok.tokenize('. "1st sentence." 2nd sentence? "3rd sentence!"')
         #     self.assertEqual(self.tok.segment(tokens, offsets),
@@ -178,6 +187,141 @@ class TestEnglishTokenizer(unittest.TestCase):
         #      {'tokens': ['"', '3rd', 'sentence', '!', '"'], 'offsets': [(32, 33), (33, 36), (37, 45), (45, 46), (46, 47)]}])
 
 
+class TestEnglishTokenizerScanner(TestEnglishTokenizer):
+    """
+    Runs all tests for EnglishTokenizer with the one-pass scanner, which must give the same tokens and offsets.
+    """
+    def __init__(self, *args, **kwargs):
+        super(TestEnglishTokenizerScanner, self).__init__(*args, **kwargs)
+        self.tok = EnglishTokenizer('../resources/tokenize', scanner=True)
+        self.rules = EnglishTokenizer('../resources/tokenize')
+
+    def assertSameTokens(self, text, offset=0):
+        self.assertEqual(self.rules.decode(text, offset), self.tok.decode(text, offset), text)
+
+    def test_scan(self):
+        # the end of the left part splits trailing symbols
+        self.assertSameTokens('d$| ab.\u20ac5 a.\u20ac\u20ac5 x\u2019.\u00a3|')
+
+        # the rest after a split is tokenized from its own beginning: edge symbols, -1, 1,000, 1:2
+        self.assertSameTokens('\u2019\'s \u2192\u2019O [-3 (-1,000) ,1:2 "\'97"')
+
+        # a regular expression ending with '$' can match at the end of the left part
+        self.assertSameTokens("B)8) <38) :Dn't ab:Pn't (1)B) &amp;:D")
+
+        # the precedence of the regular expressions over their positions
+        self.assertSameTokens(':)a@b.cc [1]http://a.b/c,d &#12;:-) x:-)[2] don\'t:( a.m.:)')
+
+    def test_random(self):
+        rng = random.Random(0)
+        chars = list("aAbBdDnoPsStx018_.,;:!?'\"`-+()[]{}<>@#$%&*/\\|~^=") + \
+                list('\u2019\u2018\u201c\u201d\u2014\u2013\u2192\u20ac\u00a3\u203c\u00e9')
+        pieces = ["n't", "'s", "'ll", 'http://', ':)', ':-)', ':D', 'B)', '8)', '<3', ':abc:', '&amp;', '&#12;', '[1]',
+                  '(a)', '((--))', 'a@b.cc', 'j:c@1.2.3.4', 'no.', '...', '?!', '1,000', '1:30', "'97", '.5', '-3',
+                  '$5', 'U.S.', 'gonna', 'whadya', '10kg', 'a.m.', 'hello.World', 'p-u-s-h', '000-0000', 'AB&CD', '``']
+
+        def chunk():
+            return ''.join(rng.choice(pieces) if rng.random() < 0.4 else
+                           ''.join(rng.choice(chars) for _ in range(rng.randint(1, 5))) for _ in range(rng.randint(1, 6)))
+
+        cache = EnglishTokenizer('../resources/tokenize', scanner=True, cache_size=100)
+        texts = [' '.join(chunk() for _ in range(rng.randint(1, 4))) for _ in range(1000)]
+
+        for i, text in enumerate(texts):
+            self.assertSameTokens(text, i % 3)
+
+        self.assertEqual([self.rules.decode(text) for text in texts], [cache.decode(text) for text in texts])
+        text = '\n'.join(texts[:100])
+        self.assertEqual(list(self.rules.decode_stream(text)), list(self.tok.decode_stream(text)))
+
+
+class TestEnglishTokenizerCache(TestEnglishTokenizer):
+    """
+    Runs all tests for EnglishTokenizer with the chunk cache, which must give the same tokens and offsets.
+    """
+    def __init__(self, *args, **kwargs):
+        super(TestEnglishTokenizerCache, self).__init__(*args, **kwargs)
+        self.tok = EnglishTokenizer('../resources/tokenize', cache_size=100)
+
+    def test_cache(self):
+        tokens = ['He', 'said', ',', '"', 'do', "n't", '"', '.']
+        self.assertEqual([self.tok.decode('He said, "don\'t".')[0] for _ in range(3)], [tokens] * 3)
+        info = self.tok.cache_info()
+        self.assertEqual(info.misses, 3)
+        self.assertEqual(info.hits, 6)
+
+        # long chunks are not memorized
+        self.tok.decode('http://www.elit.cloud/' + 'a' * CACHE_MAX_CHUNK)
+        self.assertEqual(self.tok.cache_info().currsize, 3)
+
+    def test_decode_batch(self):
+        tok = EnglishTokenizer('../resources/tokenize')
+        texts = ['He said, "don\'t".', 'He said, "don\'t".', '"Hello" he said.']
+        self.assertEqual(tok.decode_batch(texts, 2), [tok.decode(text, 2) for text in texts])
+        self.assertEqual(self.tok.decode_batch(texts, 2), [tok.decode(text, 2) for text in texts])
+
+
+class TestEnglishBundle(unittest.TestCase):
+    def test_bundle(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = build_english_bundle('../resources/tokenize', os.path.join(tmp, 'english_tokenize.bundle'))
+            bundle = load_english_bundle(filename, '../resources/tokenize')
+
+        resource = read_english_resource('../resources/tokenize')
+        self.assertEqual(bundle, dict(resource, PATTERNS=dict(resource['PATTERNS'])))
+
+    def test_stale_bundle(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            resource_dir = os.path.join(tmp, 'tokenize')
+            shutil.copytree('../resources/tokenize', resource_dir)
+            filename = build_english_bundle(resource_dir)
+            self.assertEqual(['Dr.', 'Choi'], EnglishTokenizer(resource_dir).decode('Dr. Choi')[0])
+
+            # remove 'dr' from the abbreviations after the bundle is built
+            filepath = os.path.join(resource_dir, 'english_abbreviation_period.txt')
+            with open(filepath, encoding='utf-8') as fin:
+                words = [line for line in fin if line.strip() != 'dr']
+            with open(filepath, 'w', encoding='utf-8') as fout:
+                fout.writelines(words)
+
+            self.assertIsNotNone(load_english_bundle(filename))
+            self.assertRaises(ValueError, load_english_bundle, filename, resource_dir)
+
+            # resources are shared per directory within a process, so the edited directory is loaded under a new path
+            edited_dir = os.path.join(tmp, 'edited')
+            os.rename(resource_dir, edited_dir)
+            self.assertEqual(['Dr', '.', 'Choi'], EnglishTokenizer(edited_dir).decode('Dr. Choi')[0])
+
+
+class TestEnglishSegmenter(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(TestEnglishSegmenter, self).__init__(*args, **kwargs)
+        self.tok = EnglishTokenizer('../resources/tokenize')
+        self.seg = EnglishSegmenter()
+
+    def test_segment(self):
+        text = '. "1st sentence." 2nd sentence? "3rd sentence!"'
+        gold = [{TOKEN: ['.', '"', '1st', 'sentence', '.', '"'], OFFSET: [(0, 1), (2, 3), (3, 6), (7, 15), (15, 16), (16, 17)]},
+                {TOKEN: ['2nd', 'sentence', '?'], OFFSET: [(18, 21), (22, 30), (30, 31)]},
+                {TOKEN: ['"', '3rd', 'sentence', '!', '"'], OFFSET: [(32, 33), (33, 36), (37, 45), (45, 46), (46, 47)]}]
+
+        self.assertEqual(self.seg.decode(*self.tok.decode(text)), gold)
+        self.assertEqual(list(self.seg.decode_stream(self.tok.decode_stream(text))), gold)
+
+    def test_stream(self):
+        consumed = []
+
+        def pairs():
+            for pair in zip(['A', '.', ')', 'B', 'C', '!'], [(0, 1), (1, 2), (2, 3), (4, 5), (6, 7), (7, 8)]):
+                consumed.append(pair[0])
+                yield pair
+
+        sentences = self.seg.decode_stream(pairs())
+        self.assertEqual(next(sentences)[TOKEN], ['A', '.', ')'])
+        self.assertEqual(consumed, ['A', '.', ')', 'B'])
+        self.assertEqual(next(sentences)[TOKEN], ['B', 'C', '!'])
+
+
 # Change to tokenizer_helper because function name with test cause test framework confused.
 def tokenizer_helper(t, s, gold_tokens, gold_offsets, offset=0):
     tokens, offsets = t.tok.decode(s, offset)
@@ -0,0 +1,90 @@
+# ========================================================================
+# Copyright 2017 Emory University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========================================================================
+import io
+import json
+import unittest
+
+import numpy as np
+
+from elit.nlp.structure import TOKEN, OFFSET, POS
+from elit.util.writer import JSONWriter, JSONLinesWriter, MessagePackWriter, NumpyWriter, read_numpy, create_writer, \
+    dumps, msgpack
+
+__author__ = 'Jinho D. Choi'
+
+
+DOCUMENTS = [
+    [{TOKEN: ['Hello', ',', 'world', '!'], OFFSET: [[0, 5], [5, 6], [7, 12], [12, 13]], POS: ['UH', ',', 'NN', '.'],
+      'sentiment-mov': [0.125, 0.25, 0.625], 'sentiment-mov-att': [[0.5, 1.0, 0.25]] * 6},
+     {TOKEN: ['Bye'], OFFSET: [[14, 17]], POS: ['UH'],
+      'sentiment-mov': [0.5, 0.25, 0.25], 'sentiment-mov-att': [[1.0]] * 6}],
+    [],
+    [{TOKEN: ['안녕'], OFFSET: [[0, 2]], POS: ['UH'],
+      'sentiment-mov': [0.0, 1.0, 0.0], 'sentiment-mov-att': [[1.0]] * 6}]]
+
+
+def write(writer, documents):
+    with writer:
+        for d in documents: writer.write(d)
+
+
+class TestWriter(unittest.TestCase):
+    def test_json(self):
+        ostream = io.StringIO()
+        write(JSONWriter(ostream), DOCUMENTS)
+        self.assertEqual(DOCUMENTS, json.loads(ostream.getvalue()))
+
+        ostream = io.StringIO()
+        write(JSONWriter(ostream), [])
+        self.assertEqual([], json.loads(ostream.getvalue()))
+
+    def test_json_lines(self):
+        ostream = io.StringIO()
+        write(JSONLinesWriter(ostream), DOCUMENTS)
+        lines = ostream.getvalue().splitlines()
+        self.assertEqual(len(DOCUMENTS), len(lines))
+        self.assertEqual(DOCUMENTS, [json.loads(line) for line in lines])
+
+    def test_dumps(self):
+        # numpy values are written as the values of their tolist()
+        x = np.array([0.1, 0.2], dtype=np.float32)
+        self.assertEqual(json.dumps({'x': x.tolist(), 'y': 3}), dumps({'x': x, 'y': np.int64(3)}))
+
+    @unittest.skipIf(msgpack is None, 'msgpack is not installed')
+    def test_msgpack(self):
+        ostream = io.BytesIO()
+        write(MessagePackWriter(ostream), DOCUMENTS)
+        unpacker = msgpack.Unpacker(io.BytesIO(ostream.getvalue()), raw=False)
+        self.assertEqual(DOCUMENTS, list(unpacker))
+
+    def test_numpy(self):
+        ostream = io.BytesIO()
+        write(NumpyWriter(ostream, batch_size=2), DOCUMENTS)
+        batches = list(read_numpy(io.BytesIO(ostream.getvalue())))
+        self.assertEqual([2, 1], [len(batch) for batch in batches])
+
+        documents = [d for batch in batches for d in batch.to_documents()]
+        expected = [[dict(sentence, **{OFFSET: [tuple(o) for o in sentence[OFFSET]]}) for sentence in d] for d in DOCUMENTS]
+        self.assertEqual(expected, documents)
+
+        # empty stream
+        self.assertEqual([], list(read_numpy(io.BytesIO())))
+
+    def test_create_writer(self):
+        self.assertIsInstance(create_writer('json', io.StringIO()), JSONWriter)
+        self.assertIsInstance(create_writer('jsonl', io.StringIO()), JSONLinesWriter)
+        self.assertIsInstance(create_writer('npy', io.BytesIO()), NumpyWriter)
+        self.assertRaises(ValueError, create_writer, 'xml', io.StringIO())